@@ -29,19 +29,34 @@ set "pycmd=python"
 
 :getpkg
 set "pkgdir=etc\python\site-packages"
-set "cli=pynuoadmin\nuodb_cli.py"
+set "zipdir=etc\python\zip"
+set "cli=%pkgdir%\pynuoadmin\nuodb_cli.py"
+set "zip=%zipdir%\pynuoadmin.zip"
 
 if "%NUOCLIENT_HOME%" == "" goto lochome
-set "pkghome=%NUOCLIENT_HOME%\%pkgdir%"
+set "pkghome=%NUOCLIENT_HOME%"
 if exist "%pkghome%\%cli%" goto run
+if exist "%pkghome%\%zip%" goto run
 
 :lochome
-set "pkghome=%~dp0..\%pkgdir%"
-if not exist "%pkghome%\%cli%" (
-    echo Cannot locate pynuoadmin installation
-    exit /b 1
-)
+set "pkghome=%~dp0.."
+if exist "%pkghome%\%cli%" goto run
+if exist "%pkghome%\%zip%" goto run
+echo Cannot locate pynuoadmin installation
+exit /b 1
 
 :run
-set "PYTHONPATH=%pkghome%;%PYTHONPATH%"
+REM Zipped bytecode for this Python version comes before the zipped sources
+set "pyver="
+for /f "tokens=2" %%v in ('"%pycmd%" --version 2^>^&1') do set "pyver=%%v"
+for /f "tokens=1,2 delims=." %%a in ("%pyver%") do set "pyver=%%a.%%b"
+set "zippath="
+for %%z in ("%pkghome%\%zipdir%\%pyver%\*.zip" "%pkghome%\%zipdir%\*.zip") do call :addzip "%%~z"
+
+set "PYTHONPATH=%zippath%%pkghome%\%pkgdir%;%PYTHONPATH%"
 "%pycmd%" -m pynuoadmin.nuodb_cli %*
+exit /b %ERRORLEVEL%
+
+:addzip
+set "zippath=%zippath%%~1;"
+goto :eof
@@ -0,0 +1,161 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Create JVM class data sharing archives for the Java tools.
+#
+# Starting the JVM dominates the time taken by short commands such as
+# "nuokeymgr --help".  With --appcds each jar that's started by
+# etc/run-java-app.sh is run once with -XX:ArchiveClassesAtExit, using the
+# JDK on the build host, to create a dynamic AppCDS archive next to it:
+#
+#   jar/<name>.jsa              the archive
+#   jar/<name>.jsa.version      the version of the Java that created it
+#
+# run-java-app.sh only uses the archive with the same Java version.  The
+# JVM also checks that the jar has the size and modification time it had
+# when the archive was created, so the jar is given the timestamp that the
+# package archives use first.
+#
+# The archive records the path of the jar in the stage, and once installed
+# the jar is somewhere else, with the archive next to it as before.  Not
+# every JVM accepts an archive whose jar has moved, so the archive and the
+# jar are copied to another directory and the JVM is made to use the copy
+# (-Xshare:on): if it can't, the archive is not shipped.
+
+import os
+import platform
+import re
+import shutil
+import tempfile
+import threading
+
+from client.utils import Globals, info, verbose, which, runout, rmfile, rmdir, savefile
+
+# -XX:ArchiveClassesAtExit was added in Java 13
+_MINVERSION = 13
+
+_MACHINES = {'x86_64': 'lin-x64', 'amd64': 'lin-x64',
+             'aarch64': 'lin-arm64', 'arm64': 'lin-arm64'}
+
+_VERSION = re.compile(r'.* version[^"]*"([^"]*)"')
+
+_JDK = None
+_JDK_LOCK = threading.Lock()
+
+
+def javaversion(java):
+    """Return the version of JAVA, as run-java-app.sh reports it, or None."""
+    (ret, out, err) = runout([java, '-version'])
+    if ret != 0:
+        return None
+    for line in (err + out).splitlines():
+        m = _VERSION.match(line)
+        if m:
+            return m.group(1)
+    return None
+
+
+def _major(version):
+    parts = version.split('.')
+    if parts[0] == '1' and len(parts) > 1:
+        parts = parts[1:]
+    m = re.match(r'\d+', parts[0])
+    return int(m.group(0)) if m else 0
+
+
+def findjdk():
+    """Return (java, version) for the JDK to create archives with, or None.
+
+    The archives are specific to the JVM and platform, so the build host
+    must be able to run the target platform's Java.
+    """
+    # Packages that are built concurrently all wait for the one search
+    with _JDK_LOCK:
+        return _findjdk()
+
+
+def _findjdk():
+    global _JDK
+    if _JDK is not None:
+        return _JDK or None
+    _JDK = False
+
+    if _MACHINES.get(platform.machine().lower()) != Globals.target:
+        info("Cannot create AppCDS archives for {} on {}".format(
+            Globals.target, platform.machine()))
+        return None
+
+    java = None
+    if os.environ.get('JAVA_HOME'):
+        java = os.path.join(os.environ['JAVA_HOME'], 'bin', 'java')
+    if java is None or not os.path.exists(java):
+        java = which('java')
+    version = javaversion(java) if java else None
+    if version is None or _major(version) < _MINVERSION:
+        info("No Java {} or later found: not creating AppCDS archives".format(_MINVERSION))
+        return None
+
+    _JDK = (java, version)
+    return _JDK
+
+
+def createarchive(stage, jarpath, args):
+    """Create the AppCDS archive for the jar JARPATH in STAGE.
+
+    The jar is run with ARGS to train the archive.  Returns True if the
+    archive was created.
+    """
+    jdk = findjdk()
+    if jdk is None:
+        return False
+    (java, version) = jdk
+
+    jsa = os.path.splitext(jarpath)[0] + '.jsa'
+    rmfile(jsa)
+    rmfile(jsa + '.version')
+
+    # The JVM checks the jar's mtime, so give it the one it'll have when
+    # it's installed from the package.
+    if Globals.source_date_epoch is not None:
+        os.utime(jarpath, (Globals.source_date_epoch, Globals.source_date_epoch))
+
+    verbose("Creating AppCDS archive {} with Java {}".format(jsa, version))
+    (ret, out, err) = runout([java, '-XX:ArchiveClassesAtExit=' + jsa,
+                              '-jar', jarpath] + list(args),
+                             cwd=stage.stagedir)
+    # The tool may exit with an error (e.g. when there's nothing to connect
+    # to): all that matters is that it created the archive.
+    if not os.path.exists(jsa):
+        info("Cannot create AppCDS archive for {} ({}):\n{}{}".format(
+            os.path.basename(jarpath), ret, out, err))
+        return False
+
+    (ret, out, err) = _relocated(java, jarpath, jsa)
+    if ret != 0:
+        info("Not shipping AppCDS archive for {}: Java {} rejects it once installed:\n{}{}".format(
+            os.path.basename(jarpath), version, out, err))
+        rmfile(jsa)
+        return False
+
+    savefile(jsa + '.version', version + '\n')
+    rel = os.path.relpath(jsa, stage.stagedir)
+    stage.omitcontents.update([rel, rel + '.version'])
+    return True
+
+
+def _relocated(java, jarpath, jsa):
+    """Start JAVA with copies of JARPATH and its archive JSA in another directory.
+
+    Returns (ret, out, err): ret is not 0 if the JVM can't use the archive.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='appcds-')
+    try:
+        # The same layout as in the stage, with the jar's mtime kept
+        jardir = os.path.join(tmpdir, os.path.basename(os.path.dirname(jarpath)))
+        os.mkdir(jardir)
+        for path in (jarpath, jsa):
+            shutil.copy2(path, jardir)
+        return runout([java, '-Xshare:on', '-Xlog:cds',
+                       '-XX:SharedArchiveFile=' + os.path.join(jardir, os.path.basename(jsa)),
+                       '-cp', os.path.join(jardir, os.path.basename(jarpath)), '-version'])
+    finally:
+        rmdir(tmpdir)
@@ -0,0 +1,409 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Create reproducible package archives.
+#
+# Archives are written in-process so that their contents depend only on the
+# files being packaged: entries are sorted, every entry gets the same mtime
+# (SOURCE_DATE_EPOCH), and modes and owners are normalized.
+#
+# A digest of the archive inputs is recorded alongside each build so that an
+# unchanged package can reuse the archive created by a previous build.
+#
+# Zip entries are compressed in parallel, each in a slot of the CPU budget,
+# and written in order.  Entries whose content is already compressed (jars,
+# nested archives, ...) are stored without compression.
+
+import os
+import gzip
+import hashlib
+import json
+import stat
+import struct
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from client.exceptions import ClientError
+from client.utils import Globals, verbose, mkdir, rmfile, loadfile, savefile
+from client.utils import runout, cpuslot
+
+# Change this if the archive layout changes, to invalidate old digests
+_LAYOUT_VERSION = '5'
+
+_BUFSIZE = 1024 * 1024
+
+# Zip files cannot represent times before 1980
+_ZIP_MINTIME = (1980, 1, 1, 0, 0, 0)
+
+# Files with these extensions are already compressed
+_STORED_EXTS = frozenset(['.jar', '.war', '.ear', '.zip', '.whl', '.egg',
+                          '.gz', '.tgz', '.bz2', '.tbz2', '.xz', '.txz',
+                          '.lz', '.tlz', '.lzma', '.zst', '.7z', '.rar',
+                          '.png', '.jpg', '.jpeg', '.gif', '.webp'])
+
+# How much of a file to sample, and the compression ratio above which
+# it's not worth compressing.
+_PROBE_SIZE = 64 * 1024
+_PROBE_MIN = 4 * 1024
+_PROBE_RATIO = 0.95
+
+# Sizes and offsets from which zip needs the zip64 extensions
+_ZIP64_LIMIT = 0xffffffff
+_ZIP64_COUNT = 0xffff
+
+
+def source_date_epoch():
+    """Return the timestamp to use for all archive entries.
+
+    Honors SOURCE_DATE_EPOCH; otherwise uses the time of the current commit
+    so that rebuilding the same sources gives the same result.
+    """
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if epoch:
+        return int(epoch)
+    (ret, out, _) = runout(['git', 'log', '-1', '--format=%ct'],
+                           cwd=Globals.clientroot)
+    if ret == 0 and out.strip().isdigit():
+        return int(out.strip())
+    return int(time.time())
+
+
+def normmode(mode):
+    """Return normalized permission bits for a file or directory MODE."""
+    if stat.S_ISDIR(mode) or mode & 0o111:
+        return 0o755
+    return 0o644
+
+
+def getentries(rootdir, name):
+    """Return the sorted archive names of NAME and everything below it.
+
+    Names are relative to ROOTDIR and always use '/' as a separator.
+    """
+    entries = [name]
+    for root, dirs, files in os.walk(os.path.join(rootdir, name)):
+        rel = os.path.relpath(root, rootdir).replace(os.sep, '/')
+        entries += ['{}/{}'.format(rel, f) for f in dirs + files]
+    return sorted(entries)
+
+
+def incompressible(path, data):
+    """Return True if the file PATH, starting with DATA, won't compress.
+
+    Known compressed formats are detected by extension, anything else by
+    quickly compressing a sample from the start of the file.
+    """
+    if os.path.splitext(path)[1].lower() in _STORED_EXTS:
+        return True
+    sample = data[:_PROBE_SIZE]
+    if len(sample) < _PROBE_MIN:
+        return False
+    return len(zlib.compress(sample, 1)) > len(sample) * _PROBE_RATIO
+
+
+def streamdigest(fobj):
+    """Return the SHA-256 hex digest of the content of file object FOBJ."""
+    hfn = hashlib.sha256()
+    for data in iter(lambda: fobj.read(_BUFSIZE), b''):
+        hfn.update(data)
+    return hfn.hexdigest()
+
+
+def filedigest(path):
+    """Return the SHA-256 hex digest of the file PATH."""
+    with open(path, 'rb') as f:
+        return streamdigest(f)
+
+
+def gzipwriter(fileobj, mtime):
+    """Return a gzip writer for FILEOBJ with a reproducible header."""
+    # No file name and a fixed mtime in the gzip header
+    return gzip.GzipFile(filename='', mode='wb', fileobj=fileobj,
+                         compresslevel=6, mtime=mtime)
+
+
+def writetar(fileobj, entries, mtime, owner, group):
+    """Write a tar stream to FILEOBJ.
+
+    ENTRIES is a list of (archive name, local path) tuples, in the order
+    they should appear.  Modes, owners and times are normalized.
+    """
+    with tarfile.open(fileobj=fileobj, mode='w', format=tarfile.GNU_FORMAT) as tar:
+        for arcname, path in entries:
+            tinfo = tar.gettarinfo(path, arcname)
+            tinfo.mtime = mtime
+            tinfo.uid = 0
+            tinfo.gid = 0
+            tinfo.uname = owner
+            tinfo.gname = group
+            if tinfo.issym():
+                tinfo.mode = 0o777
+            elif tinfo.isdir():
+                tinfo.mode = 0o755
+            else:
+                tinfo.mode = normmode(tinfo.mode)
+            if tinfo.isreg():
+                with open(path, 'rb') as f:
+                    tar.addfile(tinfo, f)
+            else:
+                tar.addfile(tinfo)
+
+
+class PackageArchive(object):
+    """A reproducible tar.gz or zip archive of one package directory."""
+
+    def __init__(self, rootdir, pkgname, owner, group):
+        self.rootdir = rootdir
+        self.pkgname = pkgname
+        self.owner = owner
+        self.group = group
+        self.mtime = Globals.source_date_epoch
+        self.iszip = not Globals.target.startswith('lin')
+        self.name = '{}.{}'.format(pkgname, 'zip' if self.iszip else 'tar.gz')
+        self.path = os.path.join(rootdir, self.name)
+        self.statefile = os.path.join(Globals.targroot, 'archives',
+                                      '{}.json'.format(self.name))
+        self._digest = None
+
+    def _path(self, entry):
+        return os.path.join(self.rootdir, *entry.split('/'))
+
+    def digest(self):
+        """Return a digest of everything that goes into the archive."""
+        if self._digest is not None:
+            return self._digest
+        hfn = hashlib.sha256()
+        hfn.update(json.dumps([_LAYOUT_VERSION, self.name, self.mtime,
+                               self.owner, self.group]).encode('utf-8'))
+        for entry in getentries(self.rootdir, self.pkgname):
+            path = self._path(entry)
+            st = os.lstat(path)
+            if stat.S_ISLNK(st.st_mode):
+                desc = ['l', os.readlink(path)]
+            elif stat.S_ISDIR(st.st_mode):
+                desc = ['d', normmode(st.st_mode)]
+            else:
+                desc = ['f', normmode(st.st_mode), st.st_size, filedigest(path)]
+            hfn.update(json.dumps([entry] + desc).encode('utf-8'))
+        self._digest = hfn.hexdigest()
+        return self._digest
+
+    def uptodate(self):
+        """Return True if the existing archive was built from the same inputs."""
+        if not os.path.exists(self.path) or not os.path.exists(self.statefile):
+            return False
+        try:
+            state = json.loads(loadfile(self.statefile))
+        except ValueError:
+            return False
+        st = os.stat(self.path)
+        return (state.get('digest') == self.digest()
+                and state.get('size') == st.st_size
+                and state.get('mtime') == st.st_mtime)
+
+    def create(self):
+        """Create the archive, replacing any existing one."""
+        digest = self.digest()
+        rmfile(self.statefile)
+        rmfile(self.path)
+        tmp = self.path + '.tmp'
+        rmfile(tmp)
+        if self.iszip:
+            # Each entry is compressed in its own slot of the CPU budget
+            self._createzip(tmp)
+        else:
+            with cpuslot():
+                self._createtar(tmp)
+        os.rename(tmp, self.path)
+
+        st = os.stat(self.path)
+        mkdir(os.path.dirname(self.statefile))
+        savefile(self.statefile, json.dumps({'digest': digest,
+                                             'size': st.st_size,
+                                             'mtime': st.st_mtime}))
+
+    def _createtar(self, out):
+        verbose("Writing {}".format(out))
+        entries = [(e, self._path(e)) for e in getentries(self.rootdir, self.pkgname)]
+        with open(out, 'wb') as raw:
+            with gzipwriter(raw, self.mtime) as gz:
+                writetar(gz, entries, self.mtime, self.owner, self.group)
+
+    def _zipinfo(self, entry):
+        """Return the ZipInfo for ENTRY, and the path of its content or None."""
+        date_time = max(time.gmtime(self.mtime)[:6], _ZIP_MINTIME)
+        path = self._path(entry)
+        # Like zip -r, store the content of symlinks not the link
+        if os.path.isdir(path):
+            zinfo = zipfile.ZipInfo(entry + '/', date_time)
+            zinfo.external_attr = ((stat.S_IFDIR | 0o755) << 16) | 0x10
+            zinfo.compress_type = zipfile.ZIP_STORED
+            content = None
+        else:
+            st = os.stat(path)
+            zinfo = zipfile.ZipInfo(entry, date_time)
+            zinfo.external_attr = (stat.S_IFREG | normmode(st.st_mode)) << 16
+            # The size of the content, which the deflated size is checked against
+            zinfo.file_size = st.st_size
+            with open(path, 'rb') as f:
+                sample = f.read(_PROBE_SIZE)
+            if sample and not incompressible(path, sample):
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            else:
+                zinfo.compress_type = zipfile.ZIP_STORED
+            content = path
+
+        # Always claim UNIX so that the result doesn't depend on the build host
+        zinfo.create_system = 3
+        # DOS times are local, with 2-second resolution: also give the exact
+        # time in an extended timestamp field, which unzip uses
+        zinfo.extra = struct.pack('<HHBl', 0x5455, 5, 1, int(self.mtime))
+        return (zinfo, content)
+
+    def _zipentry(self, entry):
+        """Return the ZipInfo for ENTRY, and its content as it's stored.
+
+        The content is None for a directory, the path of the file if it's
+        stored, or a temporary file with the deflated data.
+        """
+        (zinfo, path) = self._zipinfo(entry)
+        if path is None:
+            zinfo.CRC = 0
+            zinfo.compress_size = 0
+            return (zinfo, None)
+        crc = 0
+        if zinfo.compress_type == zipfile.ZIP_STORED:
+            with open(path, 'rb') as src:
+                for data in iter(lambda: src.read(_BUFSIZE), b''):
+                    crc = zlib.crc32(data, crc)
+            zinfo.CRC = crc & 0xffffffff
+            zinfo.compress_size = zinfo.file_size
+            return (zinfo, path)
+        out = tempfile.SpooledTemporaryFile(max_size=_BUFSIZE, dir=self.rootdir)
+        comp = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        with cpuslot():
+            with open(path, 'rb') as src:
+                for data in iter(lambda: src.read(_BUFSIZE), b''):
+                    crc = zlib.crc32(data, crc)
+                    out.write(comp.compress(data))
+            out.write(comp.flush())
+        zinfo.CRC = crc & 0xffffffff
+        zinfo.compress_size = out.tell()
+        out.seek(0)
+        return (zinfo, out)
+
+    def _createzip(self, out):
+        verbose("Writing {}".format(out))
+        workers = max(1, int(Globals.jobs))
+        stored = 0
+        with open(out, 'wb') as f:
+            zf = _ZipStream(f)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Keep a bounded number of compressed entries waiting, and
+                # write them in order as they complete.
+                pending = deque()
+                for entry in getentries(self.rootdir, self.pkgname):
+                    pending.append(pool.submit(self._zipentry, entry))
+                    while len(pending) > workers * 2 or pending and pending[0].done():
+                        stored += zf.add(*pending.popleft().result())
+                while pending:
+                    stored += zf.add(*pending.popleft().result())
+            zf.close()
+        verbose("Stored {} already-compressed entries in {}".format(stored, out))
+
+
+def _dostime(date_time):
+    """Return the DOS (time, date) of the DATE_TIME tuple of a ZipInfo."""
+    (year, month, day, hour, minute, second) = date_time
+    return ((hour << 11) | (minute << 5) | (second // 2),
+            ((year - 1980) << 9) | (month << 5) | day)
+
+
+class _ZipStream(object):
+    """Write a zip file of entries that have already been compressed.
+
+    zipfile can only add entries that it compresses itself, so the headers
+    are written here (see PKWARE's APPNOTE.TXT), using the zip64 extensions
+    where sizes, offsets or the number of entries need them.  The entries
+    are described by ZipInfo objects with their CRC and sizes set.
+    """
+
+    def __init__(self, fileobj):
+        self.fp = fileobj
+        self.written = []
+
+    @staticmethod
+    def _name(zinfo):
+        try:
+            return (zinfo.filename.encode('ascii'), 0)
+        except UnicodeEncodeError:
+            # Flag the name as UTF-8
+            return (zinfo.filename.encode('utf-8'), 0x800)
+
+    def add(self, zinfo, content):
+        """Add ZINFO with CONTENT as returned by PackageArchive._zipentry().
+
+        Returns 1 if the entry was stored uncompressed, else 0.
+        """
+        offset = self.fp.tell()
+        (name, flags) = self._name(zinfo)
+        (dostime, dosdate) = _dostime(zinfo.date_time)
+        extra = zinfo.extra
+        if zinfo.file_size >= _ZIP64_LIMIT or zinfo.compress_size >= _ZIP64_LIMIT:
+            extra = struct.pack('<HHQQ', 1, 16, zinfo.file_size, zinfo.compress_size) + extra
+            (version, csize, usize) = (45, _ZIP64_LIMIT, _ZIP64_LIMIT)
+        else:
+            (version, csize, usize) = (20, zinfo.compress_size, zinfo.file_size)
+        self.fp.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, version, flags,
+                                  zinfo.compress_type, dostime, dosdate, zinfo.CRC,
+                                  csize, usize, len(name), len(extra)))
+        self.fp.write(name)
+        self.fp.write(extra)
+        if content is not None:
+            src = open(content, 'rb') if isinstance(content, str) else content
+            with src:
+                size = 0
+                for data in iter(lambda: src.read(_BUFSIZE), b''):
+                    self.fp.write(data)
+                    size += len(data)
+            if size != zinfo.compress_size:
+                raise ClientError("{} changed while it was archived".format(zinfo.filename))
+        self.written.append((zinfo, offset))
+        return int(zinfo.compress_type == zipfile.ZIP_STORED and zinfo.file_size > 0)
+
+    def close(self):
+        """Write the central directory."""
+        start = self.fp.tell()
+        for (zinfo, offset) in self.written:
+            (name, flags) = self._name(zinfo)
+            (dostime, dosdate) = _dostime(zinfo.date_time)
+            extra = zinfo.extra
+            sizes = (zinfo.compress_size, zinfo.file_size, offset)
+            if max(sizes) >= _ZIP64_LIMIT:
+                extra = struct.pack('<HHQQQ', 1, 24, zinfo.file_size,
+                                    zinfo.compress_size, offset) + extra
+                (version, sizes) = (45, (_ZIP64_LIMIT,) * 3)
+            else:
+                version = 20
+            self.fp.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50,
+                                      (zinfo.create_system << 8) | version, version,
+                                      flags, zinfo.compress_type, dostime, dosdate,
+                                      zinfo.CRC, sizes[0], sizes[1], len(name),
+                                      len(extra), 0, 0, 0, zinfo.external_attr, sizes[2]))
+            self.fp.write(name)
+            self.fp.write(extra)
+        end = self.fp.tell()
+        (count, size) = (len(self.written), end - start)
+        if count >= _ZIP64_COUNT or size >= _ZIP64_LIMIT or start >= _ZIP64_LIMIT:
+            self.fp.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0,
+                                      count, count, size, start))
+            self.fp.write(struct.pack('<IIQI', 0x07064b50, 0, end, 1))
+            (count, size, start) = (min(count, _ZIP64_COUNT), min(size, _ZIP64_LIMIT),
+                                    min(start, _ZIP64_LIMIT))
+        self.fp.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+                                  size, start, 0))
@@ -9,41 +9,45 @@ import json
 import re
 import xml.etree.ElementTree as ET
 
+import socket
+
 try:
     # Python3
     from urllib.request import urlopen
     from urllib.error import URLError, HTTPError
+    from http.client import HTTPException
 except ImportError:
     # Python2
     from urllib2 import urlopen, URLError, HTTPError
+    from httplib import HTTPException
 
 from client.exceptions import DownloadError
+from client.progress import PROGRESS
 from client.utils import Globals, verbose, mkdir, rmfile, rmdir
 from client.utils import run, runout, which
 
 
 __CONTEXT = None
 
+# Give up on a connection that sends nothing for this many seconds
+_TIMEOUT = 300
 
-def _getremotedata(url):
-    """Read a remote URL and return its data.
+_BUFSIZE = 256 * 1024
 
-    This is probably not efficient for large downloads...
-    """
+
+def _openremote(url):
+    """Open a remote URL for reading."""
     global __CONTEXT
     if __CONTEXT is None:
         # Ignore cert: insecure but...
         __CONTEXT = ssl._create_unverified_context()
 
-    remote = None
     try:
         verbose("Downloading: {}".format(url))
         try:
-            remote = urlopen(url, context=__CONTEXT)
+            return urlopen(url, context=__CONTEXT, timeout=_TIMEOUT)
         except AttributeError:
-            remote = urlopen(url)
-
-        return remote.read()
+            return urlopen(url, timeout=_TIMEOUT)
 
     except HTTPError as ex:
         msg = "HTTP Error: {}\nFailed reading {}".format(str(ex.reason), url)
@@ -53,9 +57,54 @@ def _getremotedata(url):
         msg = "URL Error: {}\nFailed reading {}".format(str(ex.reason), url)
         verbose("Download failed: {}".format(msg))
         raise DownloadError(msg)
+
+
+def _readerror(url, ex):
+    msg = "{}: {}\nFailed reading {}".format(type(ex).__name__, str(ex), url)
+    verbose("Download failed: {}".format(msg))
+    return DownloadError(msg)
+
+
+def _getremotedata(url):
+    """Read a remote URL and return its data.
+
+    This is for small documents: use _download() for artifacts.
+    """
+    remote = _openremote(url)
+    try:
+        return remote.read()
+    except (socket.timeout, EnvironmentError, HTTPException) as ex:
+        raise _readerror(url, ex)
+    finally:
+        remote.close()
+
+
+def _download(url, path):
+    """Download the remote URL into PATH, reporting the progress."""
+    remote = _openremote(url)
+    part = path + '.part'
+    transfer = None
+    try:
+        length = remote.info().get('Content-Length')
+        total = int(length) if length and length.isdigit() else None
+        transfer = PROGRESS.start(os.path.basename(path), total)
+        with open(part, 'wb') as local:
+            for data in iter(lambda: remote.read(_BUFSIZE), b''):
+                local.write(data)
+                transfer.update(len(data))
+        if total is not None and transfer.done != total:
+            raise DownloadError("Received {} of {} bytes\nFailed reading {}".format(
+                transfer.done, total, url))
+        os.rename(part, path)
+        PROGRESS.finish(transfer)
+        transfer = None
+    except (socket.timeout, EnvironmentError, HTTPException) as ex:
+        raise _readerror(url, ex)
     finally:
-        if remote:
-            remote.close()
+        if transfer is not None:
+            PROGRESS.finish(transfer, failed=True)
+        remote.close()
+        rmfile(part)
 
 
 class GitHubMetadata(object):
@@ -177,9 +226,7 @@ class Artifact(BaseArtifact):
         mkdir(os.path.dirname(self.path))
         rmfile(self.path)
 
-        data = _getremotedata(self.url)
-        with open(self.path, "wb") as local:
-            local.write(data)
+        _download(self.url, self.path)
 
     def validate(self):
         """Validate the artifact's hash."""
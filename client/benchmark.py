@@ -0,0 +1,436 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Measure how quickly the launchers in a built package start.
+#
+# Each launcher is run with a trivial command line (e.g. "nuocmd --help"):
+#
+#   cold        every run gets a new, empty HOME, so nothing the launchers
+#               keep between runs (the Java probe cache in $NUODB_RUNDIR,
+#               configuration directories, ...) is there yet, and no
+#               bytecode is written
+#   warm        all runs share one HOME, after a run to fill it
+#
+# Python bytecode is kept in the run's HOME (PYTHONPYCACHEPREFIX) rather
+# than in the package, so that no run finds the bytecode of another.  An
+# unpacked package is copied first, so that it's left as it was.
+#
+# The wall time of each run is recorded, and one more run of each launcher
+# is made to find out where the time goes:
+#
+#   files       the files that were opened, or looked for, if strace is
+#               installed
+#   imports     the time taken by each top-level Python import, from
+#               PYTHONPROFILEIMPORTTIME
+#   jvm         the JVM startup phases from -Xlog:startuptime, and the
+#               number of classes that were loaded from a shared archive
+#
+# The report is a JSON file with sorted keys, so that the reports of two
+# builds can be diffed, or compared with "benchmark --compare".
+#
+# The OS page cache is not dropped (that needs root): cold runs still find
+# the package's own files in memory.
+#
+# With "benchmark --build ARGS" the whole of "build ARGS" is timed instead,
+# with each --schedule (see client.schedule), to check that the order that
+# packages are built in shortens the build.  A first build fills the
+# download caches and the history of step times, then each timed build
+# starts from "build --clean", alternating between the schedules.
+
+import os
+import re
+import json
+import time
+import shutil
+import platform
+import tempfile
+import threading
+import subprocess
+
+from client.exceptions import ClientError
+from client.schedule import SCHEDULES
+from client.utils import Globals, info, verbose, which, runcmd, unpack_file
+from client.utils import mkdir, rmdir, loadfile, savefile
+
+FORMAT = 1
+
+# (name, path in the package, arguments, runtime)
+LAUNCHERS = [('nuocmd', 'bin/nuocmd', ['--help'], 'python'),
+             ('nuosql', 'bin/nuosql', ['--version'], 'native'),
+             ('nuodbmgr', 'bin/nuodbmgr', ['--help'], 'java'),
+             ('nuokeymgr', 'etc/nuokeymgr', ['--help'], 'java'),
+             ('nuodb-migrator', 'bin/nuodb-migrator', ['--help'], 'java')]
+
+# Settings that would point the launchers outside of the run's own HOME
+_ISOLATE = ('NUOCLIENT_HOME', 'NUODB_CFGDIR', 'NUODB_VARDIR', 'NUODB_LOGDIR',
+            'NUODB_RUNDIR', 'NUODB_CRASHDIR', 'NUODB_JAVA_REPROBE',
+            'XDG_CONFIG_HOME', 'XDG_DATA_HOME', 'XDG_RUNTIME_DIR',
+            'JAVA_TOOL_OPTIONS', 'PYTHONPYCACHEPREFIX', 'PYTHONDONTWRITEBYTECODE',
+            'PYTHONPROFILEIMPORTTIME', 'PYTHONPATH', 'PYTHONHOME')
+
+# The number of the slowest imports to report
+_TOPIMPORTS = 15
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+_IMPORTTIME = re.compile(r'import time:\s+(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)')
+_STARTUPTIME = re.compile(r'\[startuptime\s*\]\s*(.+?),\s*([\d.]+) secs')
+_CLASSLOAD = re.compile(r'\[class,load\s*\]\s*\S+ source: (.*)')
+_SYSCALL = re.compile(r'^(?:\d+\s+)?(\w+)\(.*\)\s+=\s+(-?\d+)')
+
+
+def openpackage(path, tmpdir):
+    """Return the installation directory of the package PATH.
+
+    PATH is either a package archive, which is unpacked into TMPDIR, or an
+    unpacked package, which is copied there.
+    """
+    dest = os.path.join(tmpdir, 'package')
+    if os.path.isdir(path):
+        home = os.path.join(dest, os.path.basename(os.path.normpath(path)))
+        info("Copying {}".format(path))
+        shutil.copytree(path, home, symlinks=True)
+        return home
+    if not os.path.isfile(path):
+        raise ClientError("No such package: {}".format(path))
+
+    mkdir(dest)
+    info("Unpacking {}".format(path))
+    unpack_file(path, dest)
+    entries = os.listdir(dest)
+    if len(entries) != 1 or not os.path.isdir(os.path.join(dest, entries[0])):
+        raise ClientError("{} does not contain a single directory".format(path))
+    return os.path.join(dest, entries[0])
+
+
+def findlauncher(home, relpath):
+    """Return the path of the launcher RELPATH in HOME, or None."""
+    exts = ['.bat', '.exe', ''] if Globals.iswindows else ['']
+    for ext in exts:
+        path = os.path.join(home, *(relpath + ext).split('/'))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def stats(times):
+    """Return the distribution of TIMES (in seconds) in milliseconds."""
+    ms = sorted(round(t * 1000.0, 3) for t in times)
+
+    def rank(pct):
+        return ms[max(0, -(-len(ms) * pct // 100) - 1)]
+    return {'min': ms[0],
+            'median': rank(50),
+            'p90': rank(90),
+            'max': ms[-1],
+            'mean': round(sum(ms) / len(ms), 3),
+            'runs': [round(t * 1000.0, 3) for t in times]}
+
+
+class Benchmark(object):
+    """Run the launchers in the installation HOME, in a scratch TMPDIR."""
+
+    def __init__(self, home, tmpdir, runs=10, timeout=60):
+        self.home = home
+        self.tmpdir = tmpdir
+        self.runs = runs
+        self.timeout = timeout
+        self._homes = 0
+
+    def _newhome(self):
+        self._homes += 1
+        path = os.path.join(self.tmpdir, 'home{}'.format(self._homes))
+        mkdir(path)
+        return path
+
+    def _env(self, home, **extra):
+        env = dict((k, v) for k, v in os.environ.items() if k not in _ISOLATE)
+        env['HOME'] = home
+        env['PYTHONPYCACHEPREFIX'] = os.path.join(home, '.pycache')
+        env.update(extra)
+        return env
+
+    def _run(self, args, env):
+        """Run ARGS and return (seconds, exit code, stderr)."""
+        start = _clock()
+        proc = runcmd(args, env=env, cwd=self.tmpdir, stdin=subprocess.PIPE,
+                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        killed = []
+        timer = threading.Timer(self.timeout, lambda: killed.append(proc.kill()))
+        timer.start()
+        try:
+            (_, err) = proc.communicate()
+            ret = proc.wait()
+        finally:
+            timer.cancel()
+        elapsed = _clock() - start
+        if killed:
+            raise ClientError("Timed out after {}s: {}".format(self.timeout, ' '.join(args)))
+        return (elapsed, ret, err.decode('utf-8', 'replace'))
+
+    def wall(self, args):
+        """Return the cold and warm distributions, and the exit code."""
+        cold = []
+        for _ in range(self.runs):
+            env = self._env(self._newhome(), PYTHONDONTWRITEBYTECODE='1')
+            cold.append(self._run(args, env)[0])
+
+        env = self._env(self._newhome())
+        (_, ret, err) = self._run(args, env)
+        warm = [self._run(args, env)[0] for _ in range(self.runs)]
+
+        if ret != 0:
+            verbose("{} exited with {}:\n{}".format(' '.join(args), ret, err))
+        return (stats(cold), stats(warm), ret)
+
+    def files(self, args):
+        """Return the number of files opened by a warm run of ARGS."""
+        strace = which('strace')
+        if strace is None:
+            info("strace is not installed: not counting the files {} opens".format(
+                os.path.basename(args[0])))
+            return None
+        out = os.path.join(self.tmpdir, 'strace.out')
+        env = self._env(self._newhome())
+        self._run(args, env)
+        self._run([strace, '-f', '-qq', '-e', 'trace=%file', '-o', out] + args, env)
+        if not os.path.exists(out):
+            return None
+
+        counts = {'open': 0, 'open_failed': 0, 'other': 0}
+        for line in loadfile(out).splitlines():
+            m = _SYSCALL.match(line)
+            if m is None:
+                continue
+            if m.group(1) in ('open', 'openat', 'openat2', 'creat'):
+                counts['open' if int(m.group(2)) >= 0 else 'open_failed'] += 1
+            else:
+                counts['other'] += 1
+        os.remove(out)
+        return counts
+
+    def imports(self, args):
+        """Return the Python import times of a warm run of ARGS."""
+        env = self._env(self._newhome(), PYTHONDONTWRITEBYTECODE='1')
+        self._run(args, env)
+        env['PYTHONPROFILEIMPORTTIME'] = '1'
+        (_, _, err) = self._run(args, env)
+
+        modules = 0
+        top = []
+        for line in err.splitlines():
+            m = _IMPORTTIME.match(line)
+            if m is None:
+                continue
+            modules += 1
+            # The imports of a module are listed before it, indented
+            if len(m.group(3)) <= 1:
+                top.append((int(m.group(2)), m.group(4)))
+        if not modules:
+            return None
+        top.sort(key=lambda t: (-t[0], t[1]))
+        return {'modules': modules,
+                'total_ms': round(sum(t[0] for t in top) / 1000.0, 3),
+                'top': [[name, round(us / 1000.0, 3)] for (us, name) in top[:_TOPIMPORTS]]}
+
+    def jvm(self, args):
+        """Return the JVM startup phases and class loading of a warm run of ARGS."""
+        phases = os.path.join(self.tmpdir, 'startuptime.log')
+        classes = os.path.join(self.tmpdir, 'classload.log')
+        env = self._env(self._newhome())
+        self._run(args, env)
+        env['JAVA_TOOL_OPTIONS'] = ('-Xlog:startuptime:file={} -Xlog:class+load:file={}'
+                                    .format(phases, classes))
+        self._run(args, env)
+        if not os.path.exists(phases) or not os.path.exists(classes):
+            return None
+
+        result = {'phases': {}, 'classes': 0, 'shared': 0}
+        for line in loadfile(phases).splitlines():
+            m = _STARTUPTIME.search(line)
+            if m:
+                result['phases'][m.group(1)] = round(float(m.group(2)) * 1000.0, 3)
+        for line in loadfile(classes).splitlines():
+            m = _CLASSLOAD.search(line)
+            if m:
+                result['classes'] += 1
+                if 'shared' in m.group(1):
+                    result['shared'] += 1
+        os.remove(phases)
+        os.remove(classes)
+        return result
+
+    def launcher(self, name, relpath, args, runtime):
+        """Return the report for one launcher, or None if it's not installed."""
+        path = findlauncher(self.home, relpath)
+        if path is None:
+            verbose("{}: not in the package".format(name))
+            return None
+        cmd = [path] + args
+        info("{}: {} runs of {}".format(name, self.runs, ' '.join([relpath] + args)))
+
+        (cold, warm, ret) = self.wall(cmd)
+        report = {'command': ' '.join([relpath] + args),
+                  'runtime': runtime,
+                  'exit': ret,
+                  'cold': cold,
+                  'warm': warm,
+                  'files': self.files(cmd)}
+        if runtime == 'python':
+            report['imports'] = self.imports(cmd)
+        elif runtime == 'java':
+            report['jvm'] = self.jvm(cmd)
+        info("{}: median {} ms cold, {} ms warm".format(
+            name, cold['median'], warm['median']))
+        return report
+
+
+def benchmark(package, runs=10, timeout=60, names=None):
+    """Return the report for the launchers NAMES (default all) in PACKAGE."""
+    tmpdir = tempfile.mkdtemp(prefix='nuodb-benchmark-')
+    try:
+        home = openpackage(package, tmpdir)
+        scratch = os.path.join(tmpdir, 'run')
+        mkdir(scratch)
+        bench = Benchmark(home, scratch, runs=runs, timeout=timeout)
+
+        launchers = {}
+        for (name, relpath, args, runtime) in LAUNCHERS:
+            if names and name not in names:
+                continue
+            report = bench.launcher(name, relpath, args, runtime)
+            if report is not None:
+                launchers[name] = report
+        if not launchers:
+            raise ClientError("No launchers found in {}".format(package))
+
+        return {'format': FORMAT,
+                'package': os.path.basename(os.path.normpath(package)),
+                'runs': runs,
+                'host': _host(),
+                'launchers': launchers}
+    finally:
+        rmdir(tmpdir)
+
+
+def _host():
+    return {'system': platform.system(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count() if hasattr(os, 'cpu_count') else None}
+
+
+def _runbuild(args, log, timeout):
+    """Run "build ARGS", with its output in LOG, and return the seconds it took."""
+    cmd = [Globals.python, os.path.join(Globals.clientroot, 'build')] + list(args)
+    verbose("Running {}".format(' '.join(cmd)))
+    start = _clock()
+    with open(log, 'w') as out:
+        proc = runcmd(cmd, cwd=Globals.clientroot, stdin=subprocess.PIPE,
+                      stdout=out, stderr=subprocess.STDOUT)
+        killed = []
+        timer = threading.Timer(timeout, lambda: killed.append(proc.kill()))
+        timer.start()
+        try:
+            proc.communicate()
+            ret = proc.wait()
+        finally:
+            timer.cancel()
+    elapsed = _clock() - start
+    if killed:
+        raise ClientError("Timed out after {}s: {}".format(timeout, ' '.join(cmd)))
+    if ret != 0:
+        tail = loadfile(log).splitlines()[-20:]
+        raise ClientError("{} exited with {}:\n{}".format(' '.join(cmd), ret, '\n'.join(tail)))
+    return elapsed
+
+
+def buildbenchmark(args, runs=3, timeout=3600, schedules=None):
+    """Return the report of timing "build ARGS" with each of SCHEDULES (default all)."""
+    schedules = schedules or SCHEDULES
+    tmpdir = tempfile.mkdtemp(prefix='nuodb-benchmark-')
+    try:
+        log = os.path.join(tmpdir, 'build.log')
+        info("Preparing: build {}".format(' '.join(args)))
+        _runbuild(args, log, timeout)
+
+        times = dict((s, []) for s in schedules)
+        for run in range(runs):
+            for schedule in schedules:
+                _runbuild(['--clean'] + list(args), log, timeout)
+                elapsed = _runbuild(list(args) + ['--schedule', schedule], log, timeout)
+                info("Run {}/{}: {} schedule {:.1f}s".format(run + 1, runs, schedule, elapsed))
+                times[schedule].append(elapsed)
+
+        builds = dict((s, stats(t)) for s, t in times.items())
+        base = builds[schedules[-1]]['median']
+        for schedule in schedules:
+            median = builds[schedule]['median']
+            against = ''
+            if schedule != schedules[-1] and base:
+                against = ' ({:+.1f}% against {})'.format((median - base) * 100.0 / base,
+                                                          schedules[-1])
+            info("{}: median {:.1f}s{}".format(schedule, median / 1000.0, against))
+        return {'format': FORMAT,
+                'build': ' '.join(args),
+                'runs': runs,
+                'host': _host(),
+                'builds': builds}
+    finally:
+        rmdir(tmpdir)
+
+
+def savereport(path, report):
+    savefile(path, json.dumps(report, indent=2, sort_keys=True) + '\n')
+
+
+def loadreport(path):
+    report = json.loads(loadfile(path))
+    if report.get('format') != FORMAT:
+        raise ClientError("{} is not a benchmark report".format(path))
+    return report
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        # Not measured in one of the reports (e.g. without strace)
+        return '{:>10} {:>10} {:>8}'.format(
+            '-' if old is None else old, '-' if new is None else new, 'not run')
+    pct = '{:+.1f}%'.format((new - old) * 100.0 / old) if old else ''
+    return '{:>10} {:>10} {:>8}'.format(old, new, pct)
+
+
+def compare(oldpath, newpath):
+    """Print the differences between the benchmark reports OLDPATH and NEWPATH."""
+    (old, new) = (loadreport(oldpath), loadreport(newpath))
+    if 'builds' in old or 'builds' in new:
+        _comparebuilds(old.get('builds', {}), new.get('builds', {}))
+        return
+    (old, new) = (old['launchers'], new['launchers'])
+
+    def get(report, *keys):
+        for key in keys:
+            if not isinstance(report, dict):
+                return None
+            report = report.get(key)
+        return report
+
+    info('{:<16} {:<20} {:>10} {:>10} {:>8}'.format('launcher', 'metric', 'old', 'new', ''))
+    for name in sorted(set(old) | set(new)):
+        rows = [('cold median ms', ('cold', 'median')),
+                ('warm median ms', ('warm', 'median')),
+                ('warm p90 ms', ('warm', 'p90')),
+                ('files opened', ('files', 'open')),
+                ('imports ms', ('imports', 'total_ms')),
+                ('shared classes', ('jvm', 'shared'))]
+        for (title, keys) in rows:
+            (o, n) = (get(old.get(name), *keys), get(new.get(name), *keys))
+            if o is not None or n is not None:
+                info('{:<16} {:<20} {}'.format(name, title, _delta(o, n)))
+
+
+def _comparebuilds(old, new):
+    info('{:<16} {:<20} {:>10} {:>10} {:>8}'.format('schedule', 'metric', 'old', 'new', ''))
+    for name in sorted(set(old) | set(new)):
+        for (title, key) in [('build median ms', 'median'), ('build p90 ms', 'p90')]:
+            (o, n) = (old.get(name, {}).get(key), new.get(name, {}).get(key))
+            info('{:<16} {:<20} {}'.format(name, title, _delta(o, n)))
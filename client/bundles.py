@@ -3,6 +3,9 @@
 # Enumerate the software bundles in the client package.
 #
 # Each stage must be associated with one bundle.
+#
+# Bundles are listed from least to most frequently changing: this is the
+# order of the layers in OCI images (see client.oci).
 
 from enum import Enum
 
@@ -0,0 +1,99 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Create delta packages between client releases.
+#
+# A delta package contains only the files that were added or changed since
+# a previous package, plus a description of the change (DELTA.json) and the
+# etc/apply-delta.py script that applies it to an existing installation:
+#
+#   <pkgname>.delta/
+#       DELTA.json
+#       apply-delta.py
+#       files/<path>       for each added or changed file
+#
+# DELTA.json contains the digests of the files the delta expects to replace
+# or remove, and the full manifest of the resulting installation so that
+# the result can be checked.
+
+import os
+import json
+import shutil
+
+from client.utils import Globals, info, mkdir, rmdir, copy, savefile
+from client.archive import PackageArchive
+from client.manifest import content
+
+DELTA_FORMAT = 1
+DELTA_SCRIPT = 'apply-delta.py'
+
+
+def compare(old, new):
+    """Compare the OLD and NEW manifest files.
+
+    Returns a tuple of sorted lists: (added, changed, removed).
+    """
+    added = sorted(p for p in new if p not in old)
+    changed = sorted(p for p in new if p in old and content(old[p]) != content(new[p]))
+    removed = sorted(p for p in old if p not in new)
+    return (added, changed, removed)
+
+
+class DeltaPackage(object):
+    """A delta package to update one package from a previous version."""
+
+    def __init__(self, rootdir, pkgname, old, new, owner, group):
+        self.rootdir = rootdir
+        self.pkgname = pkgname
+        self.old = old
+        self.new = new
+        self.owner = owner
+        self.group = group
+        self.deltaname = '{}.delta'.format(pkgname)
+        self.deltadir = os.path.join(rootdir, self.deltaname)
+
+    def _build(self):
+        """Populate the delta directory.  Returns the delta description."""
+        oldfiles = self.old['files']
+        newfiles = self.new['files']
+        (added, changed, removed) = compare(oldfiles, newfiles)
+
+        rmdir(self.deltadir)
+        mkdir(self.deltadir)
+        filesdir = os.path.join(self.deltadir, 'files')
+        for path in added + changed:
+            # Links are recreated from the manifest
+            if 'link' in newfiles[path]:
+                continue
+            dst = os.path.join(filesdir, *path.split('/'))
+            mkdir(os.path.dirname(dst))
+            shutil.copy2(os.path.join(self.rootdir, self.pkgname, *path.split('/')), dst)
+
+        copy(os.path.join(Globals.etcdir, DELTA_SCRIPT), self.deltadir)
+
+        delta = {'format': DELTA_FORMAT,
+                 'from': self.old.get('package'),
+                 'to': self.pkgname,
+                 'added': added,
+                 'changed': changed,
+                 'removed': removed,
+                 'before': dict((p, oldfiles[p]) for p in changed + removed),
+                 'manifest': newfiles}
+        savefile(os.path.join(self.deltadir, 'DELTA.json'),
+                 json.dumps(delta, indent=1, sort_keys=True) + '\n')
+        return delta
+
+    def create(self):
+        """Create the delta archive and return it."""
+        delta = self._build()
+        info("Delta {} -> {}: {} added, {} changed, {} removed".format(
+            delta['from'], self.pkgname, len(delta['added']),
+            len(delta['changed']), len(delta['removed'])))
+
+        archive = PackageArchive(self.rootdir, self.deltaname, self.owner, self.group)
+        if archive.uptodate():
+            info("Reusing {} (contents unchanged) ...".format(archive.name))
+        else:
+            info("Creating {} ...".format(archive.name))
+            archive.create()
+        rmdir(self.deltadir)
+        return archive
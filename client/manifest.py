@@ -0,0 +1,194 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Machine-readable package manifests.
+#
+# A manifest describes every file in a package, relative to the package's
+# top-level directory:
+#
+#   {"package": <pkgname>, "bundle": <bundle>, "version": <version>,
+#    "target": <target>, "mtime": <timestamp of every file in the archive>,
+#    "files": {<path>: {"size": <bytes>, "mode": <mode>, "sha256": <hex>,
+#                       "stage": <stage>, "version": <stage version>}
+#              <path>: {"link": <target>, "stage": ..., "version": ...}}}
+#
+# Files that don't come from a stage (e.g. README.txt) have no "stage" or
+# "version".  Manifests are saved next to each package archive so that later
+# builds can compare against them (for example to create delta packages).
+#
+# Each package also contains a manifest of each bundle in it, in
+# etc/manifest/<bundle>.json, with just the files of the bundle's stages, so
+# that an installation can be checked without hashing all of it (see
+# etc/verify-install.py).
+#
+# The digests of staged files are computed as they are copied into the
+# stage (see client.utils.copy()), so only files that were created or
+# changed after that are read again.
+
+import os
+import json
+import stat
+import tarfile
+import zipfile
+
+from client.exceptions import ClientError
+from client.utils import Globals, mkdir, loadfile, savefile
+from client.archive import normmode, filedigest, streamdigest
+
+MANIFEST_EXT = '.manifest.json'
+
+
+BUNDLE_MANIFEST_DIR = 'etc/manifest'
+
+# The keys of a file entry that describe its content
+CONTENT_KEYS = ('size', 'mode', 'sha256', 'link')
+
+
+def content(entry):
+    """Return the manifest ENTRY without what it says about its origin."""
+    return dict((k, v) for k, v in entry.items() if k in CONTENT_KEYS)
+
+
+def fileentry(path, digests=None):
+    """Return the manifest entry for the file or symlink PATH.
+
+    A digest recorded for PATH in DIGESTS (see client.utils.copy()) is used
+    if the file's size and modification time haven't changed since.
+    """
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode):
+        return {'link': os.readlink(path)}
+    known = digests.get(path) if digests else None
+    if known is not None and tuple(known[1:]) == (st.st_size, st.st_mtime):
+        digest = known[0]
+    else:
+        digest = filedigest(path)
+    return {'size': st.st_size,
+            'mode': normmode(st.st_mode),
+            'sha256': digest}
+
+
+def _walkfiles(rootdir):
+    """Yield (name, path) for each file and symlink below ROOTDIR."""
+    for root, dirs, files in os.walk(rootdir):
+        rel = os.path.relpath(root, rootdir).replace(os.sep, '/')
+        prefix = '' if rel == '.' else rel + '/'
+        links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        for name in files + links:
+            yield (prefix + name, os.path.join(root, name))
+
+
+def treemanifest(rootdir, digests=None):
+    """Return the files below ROOTDIR for a manifest.
+
+    See fileentry() for DIGESTS.
+    """
+    return dict((rel, fileentry(path, digests)) for rel, path in _walkfiles(rootdir))
+
+
+def _current(entry, path):
+    # A cheap check that PATH still has the content ENTRY describes
+    if 'link' in entry:
+        return os.path.islink(path) and os.readlink(path) == entry['link']
+    return not os.path.islink(path) and os.path.getsize(path) == entry['size']
+
+
+def packagemanifest(pkgdir, stages):
+    """Return the files in PKGDIR, which has the content of STAGES.
+
+    Files copied from a stage take their entry from the stage's manifest,
+    with the stage's name and version: only other files are read.
+    """
+    staged = {}
+    # Stages are copied in order, so a later one replaces an earlier one
+    for stg in stages:
+        for rel, entry in stg.getmanifest().items():
+            staged[rel] = dict(entry, stage=stg.name, version=stg.version)
+
+    files = {}
+    for rel, path in _walkfiles(pkgdir):
+        entry = staged.get(rel)
+        if entry is None or not _current(entry, path):
+            entry = fileentry(path)
+        files[rel] = entry
+    return files
+
+
+def bundlemanifests(pkgdir, files, stages):
+    """Save the manifest of each bundle of STAGES in PKGDIR.
+
+    FILES are the files of the package (see packagemanifest()); the entries
+    of the manifests that are saved are added to it.
+    """
+    bundles = {}
+    for stg in stages:
+        bundles[stg.name] = str(stg.bundle)
+
+    for bundle in sorted(set(bundles.values())):
+        bfiles = dict((rel, entry) for rel, entry in files.items()
+                      if bundles.get(entry.get('stage')) == bundle)
+        rel = '{}/{}.json'.format(BUNDLE_MANIFEST_DIR, bundle)
+        path = os.path.join(pkgdir, *rel.split('/'))
+        mkdir(os.path.dirname(path))
+        savemanifest(path, {'bundle': bundle,
+                            'version': Globals.version,
+                            'target': Globals.target,
+                            'mtime': Globals.source_date_epoch,
+                            'files': bfiles})
+        files[rel] = fileentry(path)
+
+
+def _striptop(names):
+    """Return the common top-level directory of NAMES."""
+    tops = set(n.split('/', 1)[0] for n in names if n)
+    if len(tops) != 1:
+        raise ClientError("Archive does not have a single top-level directory")
+    return tops.pop()
+
+
+def archivemanifest(path):
+    """Return a manifest for the package archive PATH."""
+    files = {}
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as zf:
+            infos = zf.infolist()
+            top = _striptop([i.filename for i in infos])
+            for zinfo in infos:
+                if zinfo.filename.endswith('/'):
+                    continue
+                with zf.open(zinfo) as f:
+                    files[zinfo.filename[len(top)+1:]] = {
+                        'size': zinfo.file_size,
+                        'mode': normmode(zinfo.external_attr >> 16),
+                        'sha256': streamdigest(f)}
+    else:
+        top = None
+        with tarfile.open(path, 'r|*') as tar:
+            for tinfo in tar:
+                if top is None:
+                    top = _striptop([tinfo.name])
+                name = tinfo.name[len(top)+1:]
+                if tinfo.issym():
+                    files[name] = {'link': tinfo.linkname}
+                elif tinfo.isreg():
+                    files[name] = {'size': tinfo.size,
+                                   'mode': normmode(tinfo.mode),
+                                   'sha256': streamdigest(tar.extractfile(tinfo))}
+        if top is None:
+            raise ClientError("Empty archive: {}".format(path))
+    return {'package': top, 'files': files}
+
+
+def loadmanifest(path):
+    """Load a manifest from a manifest file or a package archive PATH."""
+    if not os.path.exists(path):
+        raise ClientError("No such manifest or package: {}".format(path))
+    if path.endswith('.json'):
+        try:
+            return json.loads(loadfile(path))
+        except ValueError as ex:
+            raise ClientError("Invalid manifest {}: {}".format(path, str(ex)))
+    return archivemanifest(path)
+
+
+def savemanifest(path, manifest):
+    savefile(path, json.dumps(manifest, indent=1, sort_keys=True) + '\n')
@@ -0,0 +1,206 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Create layered OCI images of client packages.
+#
+# Rather than one tarball, the package is written as an OCI image layout
+# directory with one layer per bundle, so that rebuilding an image after
+# one bundle changes only invalidates that bundle's layer.  Layers are
+# ordered as the bundles are in client.bundles.Bundles (least frequently
+# changing first), followed by a layer with the package metadata (README
+# etc.) which changes with every build.
+#
+# The layout is also written as a tar file which can be loaded with
+# "docker load" or "podman load".  Everything is reproducible: building
+# the same content gives the same image digests.
+
+import os
+import hashlib
+import json
+import time
+
+from client.utils import Globals, verbose, mkdir, rmdir, rmfile, savefile
+from client.utils import cpuslot, parallel
+from client.archive import getentries, gzipwriter, writetar, filedigest
+from client.bundles import Bundles
+
+_MEDIA_INDEX = 'application/vnd.oci.image.index.v1+json'
+_MEDIA_MANIFEST = 'application/vnd.oci.image.manifest.v1+json'
+_MEDIA_CONFIG = 'application/vnd.oci.image.config.v1+json'
+_MEDIA_LAYER = 'application/vnd.oci.image.layer.v1.tar+gzip'
+
+_ARCHITECTURES = {'lin-x64': 'amd64', 'lin-arm64': 'arm64'}
+
+# Where the package is installed in the image
+IMAGE_ROOT = 'opt/nuodb-client'
+
+METADATA_LAYER = 'metadata'
+
+
+class _HashWriter(object):
+    """A file-like writer that computes the digest of what's written."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hfn = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hfn.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        pass
+
+
+def _json(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _savebytes(filename, data):
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+
+class OCIImage(object):
+    """A layered OCI image of the package directory ROOTDIR/PKGNAME.
+
+    STAGES are the stages that were installed into the package.
+    """
+
+    def __init__(self, rootdir, pkgname, bundle, stages, owner, group):
+        self.rootdir = rootdir
+        self.pkgname = pkgname
+        self.bundle = bundle
+        self.stages = stages
+        self.owner = owner
+        self.group = group
+        self.mtime = Globals.source_date_epoch
+        self.name = '{}.oci'.format(pkgname)
+        self.path = os.path.join(rootdir, self.name)
+        self.tarpath = self.path + '.tar'
+        self.blobdir = os.path.join(self.path, 'blobs', 'sha256')
+
+    def layers(self):
+        """Return a list of (layer name, [relative path, ...]) tuples.
+
+        Each file in the package is placed in the layer of the first bundle
+        that contains it; anything not staged by any bundle goes in the
+        metadata layer.
+        """
+        owners = {}
+        for bundle in Bundles:
+            for stg in self.stages:
+                if stg.bundle != bundle:
+                    continue
+                for root, _, files in os.walk(stg.stagedir):
+                    rel = os.path.relpath(root, stg.stagedir).replace(os.sep, '/')
+                    for f in files:
+                        path = f if rel == '.' else '{}/{}'.format(rel, f)
+                        owners.setdefault(path, str(bundle))
+
+        prefix = self.pkgname + '/'
+        contents = dict((str(b), []) for b in Bundles)
+        contents[METADATA_LAYER] = []
+        for entry in getentries(self.rootdir, self.pkgname):
+            path = os.path.join(self.rootdir, *entry.split('/'))
+            if os.path.isdir(path) and not os.path.islink(path):
+                continue
+            rel = entry[len(prefix):]
+            contents[owners.get(rel, METADATA_LAYER)].append(rel)
+
+        names = [str(b) for b in Bundles] + [METADATA_LAYER]
+        return [(n, contents[n]) for n in names if contents[n]]
+
+    def _blob(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        _savebytes(os.path.join(self.blobdir, digest), data)
+        return {'digest': 'sha256:' + digest, 'size': len(data)}
+
+    def _layer(self, layer):
+        """Write the blob for LAYER; returns (descriptor, diff_id)."""
+        (name, files) = layer
+        entries = []
+        dirs = set()
+        pkgdir = os.path.join(self.rootdir, self.pkgname)
+        for rel in files:
+            # Each layer needs to contain all the parent directories
+            parts = (IMAGE_ROOT + '/' + rel).split('/')
+            for i in range(1, len(parts)):
+                parent = '/'.join(parts[:i])
+                if parent not in dirs:
+                    dirs.add(parent)
+                    entries.append((parent, pkgdir))
+            entries.append(('/'.join(parts), os.path.join(pkgdir, *rel.split('/'))))
+
+        tmp = os.path.join(self.blobdir, 'layer-{}.tmp'.format(name))
+        with cpuslot():
+            with open(tmp, 'wb') as raw:
+                with gzipwriter(raw, self.mtime) as gz:
+                    tarstream = _HashWriter(gz)
+                    writetar(tarstream, entries, self.mtime, self.owner, self.group)
+        digest = filedigest(tmp)
+        os.rename(tmp, os.path.join(self.blobdir, digest))
+        verbose("Layer {}: {} files, sha256:{}".format(name, len(files), digest))
+
+        desc = {'mediaType': _MEDIA_LAYER,
+                'digest': 'sha256:' + digest,
+                'size': os.path.getsize(os.path.join(self.blobdir, digest)),
+                'annotations': {'org.opencontainers.image.title': name}}
+        return (desc, 'sha256:' + tarstream.hfn.hexdigest())
+
+    def create(self):
+        """Create the image layout directory and its tar file."""
+        rmdir(self.path)
+        mkdir(self.blobdir)
+
+        layers = self.layers()
+        results = parallel(self._layer, layers)
+
+        created = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.mtime))
+        bindir = '/{}/bin'.format(IMAGE_ROOT)
+        config = {'created': created,
+                  'architecture': _ARCHITECTURES[Globals.target],
+                  'os': 'linux',
+                  'config': {'Env': ['PATH={}:/usr/local/sbin:/usr/local/bin:'
+                                     '/usr/sbin:/usr/bin:/sbin:/bin'.format(bindir),
+                                     'NUOCLIENT_HOME=/{}'.format(IMAGE_ROOT)]},
+                  'rootfs': {'type': 'layers',
+                             'diff_ids': [diff_id for _, diff_id in results]},
+                  'history': [{'created': created,
+                               'created_by': 'nuodb-client build: {}'.format(name)}
+                              for name, _ in layers]}
+        cfgdesc = dict(mediaType=_MEDIA_CONFIG, **self._blob(_json(config)))
+
+        manifest = {'schemaVersion': 2,
+                    'mediaType': _MEDIA_MANIFEST,
+                    'config': cfgdesc,
+                    'layers': [desc for desc, _ in results]}
+        mfdesc = dict(mediaType=_MEDIA_MANIFEST, **self._blob(_json(manifest)))
+
+        tag = 'nuodb-{}:{}'.format(self.bundle, Globals.version)
+        mfdesc['annotations'] = {'io.containerd.image.name': tag,
+                                 'org.opencontainers.image.ref.name': Globals.version}
+        savefile(os.path.join(self.path, 'index.json'),
+                 _json({'schemaVersion': 2, 'mediaType': _MEDIA_INDEX,
+                        'manifests': [mfdesc]}).decode('utf-8'))
+        savefile(os.path.join(self.path, 'oci-layout'),
+                 _json({'imageLayoutVersion': '1.0.0'}).decode('utf-8'))
+
+        # Docker before 25.0 only understands its own manifest format
+        blob = 'blobs/sha256/{}'
+        savefile(os.path.join(self.path, 'manifest.json'),
+                 _json([{'Config': blob.format(cfgdesc['digest'][7:]),
+                         'RepoTags': [tag],
+                         'Layers': [blob.format(d['digest'][7:]) for d, _ in results]}]).decode('utf-8'))
+
+        rmfile(self.tarpath)
+        entries = [(e[len(self.name)+1:], os.path.join(self.rootdir, *e.split('/')))
+                   for e in getentries(self.rootdir, self.name)[1:]]
+        with open(self.tarpath + '.tmp', 'wb') as out:
+            writetar(out, entries, self.mtime, self.owner, self.group)
+        os.rename(self.tarpath + '.tmp', self.tarpath)
+        return mfdesc['digest']
@@ -12,22 +12,34 @@
 #    patch()         : Apply local patches to the package
 #    test()          : Test the package
 #    install()       : Install the package
+#    finalize()      : Post-process the staged content
 #
 #    clean()         : Clean the package
 
 import os
 import inspect
+import time
 
 from datetime import datetime
 from string import Template
 
-from client.utils import Globals, info, rmdir
+from client.utils import Globals, info, mkdir, rmdir
+from client.resources import measure, historypath, loadhistory, estimatestep
+from client.schedule import runscheduled
+from client.unpackcache import UnpackCache
 
 
 class Package(object):
     """Base class for a package."""
 
     _PACKAGES = {}
+    _BUILDLIST = []
+
+    # True if the package supports Globals.repack
+    repackable = False
+
+    # The steps that are skipped when the install is reused
+    SKIPPABLE_STEPS = ['download', 'validate', 'unpack', 'patch', 'make', 'test']
 
     @staticmethod
     def get_packages():
@@ -37,8 +49,35 @@ class Package(object):
     def get_package(name):
         return Package._PACKAGES.get(name)
 
+    @staticmethod
+    def get_buildlist():
+        """Return the names of the packages being built, in build order."""
+        return list(Package._BUILDLIST)
+
+    @classmethod
+    def setbuildlist(cls, pkglist):
+        """Set the packages being built to PKGLIST and their prerequisites.
+
+        Returns their names in build order.
+        """
+        Package._BUILDLIST = cls.buildorder(pkglist)
+        return cls.get_buildlist()
+
     @classmethod
     def build_all(cls, pkglist):
+        # Packages are built concurrently: see client.schedule
+        cls.setbuildlist(pkglist)
+        history = loadhistory(historypath())
+        packages = dict((name, Package._PACKAGES[name]) for name in Package._BUILDLIST)
+        runscheduled(Package._BUILDLIST,
+                     dict((name, pkg.prereqs()) for name, pkg in packages.items()),
+                     dict((name, pkg.estimate(history)) for name, pkg in packages.items()),
+                     lambda name: packages[name].build(),
+                     int(Globals.jobs))
+
+    @classmethod
+    def buildorder(cls, pkglist):
+        """Return the names of PKGLIST and their prerequisites, in build order."""
         # Recursively discover prerequisites.  We won't try to remove
         # dups: we'll just only build things once.  It can get stuck in
         # infinite loop so... just don't do that!
@@ -55,16 +94,19 @@ class Package(object):
         # The prereqs we want to build first are at the end
         prereqs.reverse()
 
-        built = []
+        order = []
         for name in prereqs:
-            if name not in built:
-                pkg = Package._PACKAGES[name]
-                pkg.build()
-                built.append(name)
+            if name not in order:
+                order.append(name)
+        return order
 
     @classmethod
     def getlicense(cls, name, holder='NuoDB, Inc.'):
-        return Template(cls._LICENCES[name]).substitute({'YEAR': datetime.today().year, 'HOLDER': holder})
+        if Globals.source_date_epoch is None:
+            year = datetime.today().year
+        else:
+            year = time.gmtime(Globals.source_date_epoch).tm_year
+        return Template(cls._LICENCES[name]).substitute({'YEAR': year, 'HOLDER': holder})
 
     def __init__(self, name):
         if name in Package._PACKAGES:
@@ -110,34 +152,109 @@ class Package(object):
         try:
             def runstep(name, func):
                 info('{}: {}'.format(self.name, name.capitalize()))
-                func()
-
-            completed = all([stg.completed for stg in self.staged])
+                with measure(self.name, name, self._usagedirs()):
+                    func()
 
-            if completed:
+            if self.reusable():
                 info('{}: Reusing install'.format(self.name))
             else:
-                runstep('download', self.download)
-                runstep('validate', self.validate)
-                runstep('unpack', self.unpack)
-                runstep('patch', self.patch)
-                runstep('make', self.make)
-                runstep('test', self.test)
+                for step in Package.SKIPPABLE_STEPS:
+                    runstep(step, getattr(self, step))
 
             runstep('install', self.install)
 
             info('{}: Staging'.format(self.name))
-            for stg in self.staged:
-                stg.complete()
+            with measure(self.name, 'stage', self._usagedirs()):
+                repacker = self.repacker()
+                for stg in self.staged:
+                    stg.complete(repacker)
+                if repacker is not None:
+                    repacker.run()
+                self.finalize()
+                for stg in self.staged:
+                    stg.save()
 
         finally:
             self.building = False
 
+    def reusable(self):
+        """Return True if the installed content can be reused.
+
+        Then the steps before install() are skipped.
+        """
+        completed = all([stg.completed for stg in self.staged])
+
+        # Repacked content is staged straight from the download, so
+        # there's no unpacked content to reuse.
+        return completed and not (Globals.repack and self.repackable)
+
+    def estimate(self, history):
+        """Return the seconds build() is expected to take, from HISTORY.
+
+        Returns None if none of the steps that will run have been timed.
+        """
+        self._setup()
+        steps = ['install', 'stage']
+        if not self.reusable():
+            steps = Package.SKIPPABLE_STEPS + steps
+        times = [estimatestep(history, self.name, step) for step in steps]
+        times = [t[0] for t in times if t is not None and t[0] is not None]
+        return sum(times) if times else None
+
+    def _usagedirs(self):
+        # The directories whose disk usage is recorded after each step
+        return {'pkgroot': [self.pkgroot],
+                'stage': [stg.stagedir for stg in self.staged],
+                'downloads': [os.path.join(Globals.downloadroot, self.name)]}
+
+    def repacker(self):
+        """Return the client.repack.Repacker to stage content with, or None.
+
+        Packages that set repackable can stage content straight from their
+        download when Globals.repack is set.
+        """
+        return None
+
     @staticmethod
     def prereqs():
         """Return a list of packages that need to be built before this one."""
         return []
 
+    def sources(self, name):
+        """Return the paths this package's stages use from package NAME.
+
+        Paths are glob patterns relative to the root of NAME's unpacked
+        content; a pattern matching a directory includes everything below
+        it.  Return None if nothing is used from NAME.
+        """
+        return None
+
+    def extractfilter(self, own=True):
+        """Return the patterns of the content to extract when unpacking.
+
+        Returns None if everything should be extracted: that is, unless this
+        package declares the sources its own stages use.  If OWN is False
+        only the content other packages use is returned.
+        """
+        patterns = self.sources(self.name)
+        if patterns is None:
+            return None
+        patterns = list(patterns) if own else []
+        for pkg in Package._PACKAGES.values():
+            if pkg is not self:
+                patterns += pkg.sources(self.name) or []
+        return sorted(set(patterns))
+
+    def unpack_artifact(self, path, members=None):
+        """Replace self.pkgroot with the unpacked content of artifact PATH.
+
+        Unpacked content is cached (see client.unpackcache) so that an
+        unchanged artifact is not unpacked again.
+        """
+        rmdir(self.pkgroot)
+        mkdir(self.pkgroot)
+        UnpackCache().unpack(path, self.pkgroot, members)
+
     def clean(self, real=False):
         """Clean up the package."""
         self._setup()
@@ -181,6 +298,10 @@ class Package(object):
         # Every package needs an install step
         raise NotImplementedError("install")
 
+    def finalize(self):
+        """Post-process the staged content, once all stages are complete."""
+        pass
+
     # ---- Licenses
 
     _LICENCES = {'3BSD': """Copyright ${YEAR} ${HOLDER}
@@ -0,0 +1,102 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# A set of relative paths, stored as a trie of path components.
+#
+# A path in the set stands for itself and everything below it, so a whole
+# directory can be added without listing its content:
+#
+#   >>> paths = PathSet(['etc/python/site-packages/requests'])
+#   >>> 'etc/python/site-packages/requests/api.py' in paths
+#   True
+#
+# Checking a path costs one step per component, however many paths there
+# are.  Iterating yields the paths that were added (apart from those below
+# another path), sorted.
+
+import os
+
+
+class PathSet(object):
+    """A set of relative paths, each including everything below it."""
+
+    # Marks a node for a path that was added
+    _END = ''
+
+    def __init__(self, paths=None):
+        self._root = {}
+        self._len = 0
+        if paths:
+            self.update(paths)
+
+    @staticmethod
+    def _split(path):
+        if os.sep != '/':
+            path = path.replace(os.sep, '/')
+        return [p for p in path.split('/') if p and p != '.']
+
+    def add(self, path):
+        node = self._root
+        for part in self._split(path):
+            if self._END in node:
+                # Already covered by a parent
+                return
+            node = node.setdefault(part, {})
+        if self._END not in node:
+            self._len += 1 - self._count(node)
+            node.clear()
+            node[self._END] = True
+
+    def update(self, paths):
+        for path in paths:
+            self.add(path)
+
+    def discard(self, path):
+        """Remove PATH, and anything added below it."""
+        parts = self._split(path)
+        nodes = [self._root]
+        for part in parts:
+            if part not in nodes[-1]:
+                return
+            nodes.append(nodes[-1][part])
+        self._len -= self._count(nodes[-1])
+        nodes[-1].clear()
+        # Prune the branch that's now empty
+        for part, parent in zip(reversed(parts), reversed(nodes[:-1])):
+            if parent[part]:
+                break
+            del parent[part]
+
+    def _count(self, node):
+        if self._END in node:
+            return 1
+        return sum(self._count(child) for child in node.values())
+
+    def __contains__(self, path):
+        node = self._root
+        for part in self._split(path):
+            if self._END in node:
+                return True
+            node = node.get(part)
+            if node is None:
+                return False
+        return self._END in node
+
+    def __iter__(self):
+        stack = [('', self._root)]
+        while stack:
+            (prefix, node) = stack.pop()
+            if self._END in node:
+                yield prefix
+                continue
+            for part in sorted(node, reverse=True):
+                stack.append((prefix + '/' + part if prefix else part, node[part]))
+
+    def __len__(self):
+        return self._len
+
+    def __iadd__(self, paths):
+        self.update(paths)
+        return self
+
+    def __repr__(self):
+        return 'PathSet({!r})'.format(list(self))
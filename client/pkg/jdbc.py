@@ -34,6 +34,11 @@ class JDBCPackage(Package):
         # We need nuodb to get the samples
         return ['nuodb']
 
+    def sources(self, name):
+        if name == 'nuodb':
+            return ['samples/doc/java']
+        return None
+
     def download(self):
         # Find the latest release
         mvn = MavenMetadata(self.__PATH)
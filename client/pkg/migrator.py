@@ -5,7 +5,7 @@
 from client.package import Package
 from client.stage import Stage
 from client.artifact import GitHubMetadata, Artifact
-from client.utils import Globals, rmdir, mkdir, unpack_file
+from client.utils import Globals
 from client.bundles import Bundles
 
 
@@ -38,9 +38,7 @@ class MigratorPackage(Package):
         self._tar.update()
 
     def unpack(self):
-        rmdir(self.pkgroot)
-        mkdir(self.pkgroot)
-        unpack_file(self._tar.path, self.pkgroot)
+        self.unpack_artifact(self._tar.path)
 
     def install(self):
         self.stage.stage('jar', ['jar/'])
@@ -8,7 +8,9 @@ from client.exceptions import DownloadError, UnpackError
 from client.package import Package
 from client.stage import Stage
 from client.artifact import Artifact
-from client.utils import Globals, mkdir, rmdir, loadfile, unpack_file, verbose
+from client.repack import ArchiveIndex, Repacker
+from client.appcds import createarchive
+from client.utils import Globals, mkdir, rmdir, loadfile, verbose
 from client.bundles import Bundles
 
 
@@ -17,6 +19,8 @@ class NuoDBPackage(Package):
 
     __PKGNAME = 'nuodb'
 
+    repackable = True
+
     __NUODB_URL = 'https://ce-downloads.nuohub.org'
     __VERSIONS = 'supportedversions.txt'
     __LINX64FORMAT = 'nuodb-{}.linux.x86_64'
@@ -25,10 +29,30 @@ class NuoDBPackage(Package):
     __ZIPFORMAT = 'nuodb-{}.win64'
     __ZIPEXT = '.zip'
 
+    # The content of the database package used by our stages.  This must
+    # match what _install_*() and install() stage.
+    __LINUX_SOURCES = ['bin/nuosql', 'bin/nuodump', 'bin/nuoloader',
+                       'lib64/libnuoclient.so', 'lib64/libNuoRemote.so',
+                       'lib64/libicu*.so.*', 'lib64/libmpir.so.*',
+                       'samples/nuoadmin-quickstart']
+    __WINDOWS_SOURCES = ['bin/nuosql.exe', 'bin/nuodump.exe', 'bin/nuoloader.exe',
+                         'bin/nuoclient.dll', 'bin/nuoclient.pdb', 'lib/nuoclient.lib',
+                         'bin/NuoRemote.dll', 'bin/NuoRemote.pdb', 'lib/NuoRemote.lib',
+                         'bin/icu*.dll', 'bin/mpir*.dll',
+                         'bin/msvcp140.dll', 'bin/vcruntime140.dll',
+                         'samples/nuoadmin-quickstart.bat']
+    __COMMON_SOURCES = ['jar/nuodbmanager.jar',
+                        'include/nuodb', 'include/NuoDB.h', 'include/SQLException.h',
+                        'include/SQLExceptionConstants.h', 'include/NuoRemote',
+                        'samples/doc/c', 'samples/doc/cpp',
+                        'samples/quickstart', 'samples/quickstart.py',
+                        'README.txt', 'license.txt', 'ce_license.txt']
+
     def __init__(self):
         super(NuoDBPackage, self).__init__(self.__PKGNAME)
         self._pkg = None
         self._dirname = None
+        self._repacker = None
 
         self.stgs = {
             'nuosql': Stage('nuosql',
@@ -69,6 +93,13 @@ class NuoDBPackage(Package):
 
         self.staged = list(self.stgs.values())
 
+    def sources(self, name):
+        if name != self.name:
+            return None
+        if Globals.target.startswith('lin'):
+            return self.__LINUX_SOURCES + self.__COMMON_SOURCES
+        return self.__WINDOWS_SOURCES + self.__COMMON_SOURCES
+
     def download(self):
         versions = Artifact(self.name, self.__VERSIONS,
                             '{}/{}'.format(self.__NUODB_URL, self.__VERSIONS))
@@ -107,15 +138,26 @@ class NuoDBPackage(Package):
         self.set_repo('NuoDB Server Package', self._pkg.url)
 
     def unpack(self):
-        rmdir(self.pkgroot)
-        mkdir(self.pkgroot)
-        unpack_file(self._pkg.path, self.pkgroot)
         udir = os.path.join(self.pkgroot, self._dirname)
-        if not os.path.exists(udir):
-            raise UnpackError("Unpack did not create %s" % (udir))
+        if Globals.repack:
+            # Our stages are written straight from the download; only
+            # unpack what other packages use.
+            rmdir(self.pkgroot)
+            mkdir(udir)
+            index = ArchiveIndex(self._pkg.path, self._dirname)
+            self._repacker = Repacker(index, udir)
+            self._repacker.extract(self.extractfilter(own=False), udir)
+            hasmgr = 'jar/nuodbmanager.jar' in index.members
+        else:
+            # Only extract the content that our stages (and others') use
+            members = ['{}/{}'.format(self._dirname, p) for p in self.extractfilter()]
+            self.unpack_artifact(self._pkg.path, members)
+            if not os.path.exists(udir):
+                raise UnpackError("Unpack did not create %s" % (udir))
+            hasmgr = os.path.exists(os.path.join(udir, 'jar', 'nuodbmanager.jar'))
 
         # Newer versions of NuoDB don't ship nuodbmanager any longer
-        if not os.path.exists(os.path.join(udir, 'jar', 'nuodbmanager.jar')):
+        if not hasmgr:
             verbose('Obsolete nuodbmanager is not present.')
             stg = self.stgs.pop('nuodbmgr')
             self.staged.remove(stg)
@@ -123,6 +165,9 @@ class NuoDBPackage(Package):
         for stg in self.staged:
             stg.basedir = udir
 
+    def repacker(self):
+        return self._repacker
+
     def _install_linux(self):
         self.stgs['nuosql'].stagefiles('bin', 'bin', ['nuosql'])
         self.stgs['nuodump'].stagefiles('bin', 'bin', ['nuodump'])
@@ -199,6 +244,11 @@ class NuoDBPackage(Package):
         for stg in self.staged:
             stg.stage('doc', ['README.txt', 'license.txt', 'ce_license.txt'])
 
+    def finalize(self):
+        if Globals.appcds and 'nuodbmgr' in self.stgs and Globals.target.startswith('lin'):
+            stg = self.stgs['nuodbmgr']
+            createarchive(stg, os.path.join(stg.stagedir, 'jar', 'nuodbmanager.jar'), ['--help'])
+
 
 # Create and register this package
 NuoDBPackage()
@@ -8,7 +8,7 @@ from client.exceptions import DownloadError
 from client.package import Package
 from client.stage import Stage
 from client.artifact import GitHubMetadata, Artifact
-from client.utils import Globals, rmdir, mkdir, unpack_file
+from client.utils import Globals
 from client.bundles import Bundles
 
 
@@ -68,9 +68,7 @@ class ODBCPackage(Package):
         self._file.update()
 
     def unpack(self):
-        rmdir(self.pkgroot)
-        mkdir(self.pkgroot)
-        unpack_file(self._file.path, self.pkgroot)
+        self.unpack_artifact(self._file.path)
 
     def install(self):
         dirname = 'nuodbodbc-%s.%s' % (self.stage.version, self._getext())
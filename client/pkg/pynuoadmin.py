@@ -4,23 +4,26 @@
 
 import os
 import shutil
+import tempfile
 
-from client.artifact import PyPIMetadata
-from client.package import Package
+from client.appcds import createarchive
+from client.pypackage import PipPackage, interpreters, launchpath, startuptime
 from client.stage import Stage
-from client.utils import Globals, getcontents, rmdir, mkdir, pipinstall
+from client.utils import Globals, info, rmdir
 from client.bundles import Bundles
 
 
-class PyNuoadminPackage(Package):
+class PyNuoadminPackage(PipPackage):
     """Add the NuoDB pynuoadmin client.
 This pulls the latest version available from PyPI.
 """
 
     __PKGNAME = 'pynuoadmin'
 
+    traceruns = [['pynuoadmin.nuocmd', '--help']]
+
     def __init__(self):
-        super(PyNuoadminPackage, self).__init__(self.__PKGNAME)
+        super(PyNuoadminPackage, self).__init__(self.__PKGNAME, extras=['completion'])
 
         self._file = None
         self._ac_file = None
@@ -37,51 +40,24 @@ This pulls the latest version available from PyPI.
         # We need nuodb to get nuokeymanager.jar and pynuoadmin uses pynuodb
         return ['nuodb', 'pynuodb']
 
-    def unpack(self):
-        pypi = PyPIMetadata(self.__PKGNAME)
-        self.set_repo(pypi.friendlytitle, pypi.friendlyurl)
-        self.setversion(pypi.version)
+    def sources(self, name):
+        if name == 'nuodb':
+            return ['drivers/pynuoadmin/nuocmd-complete', 'jar/nuokeymanager.jar',
+                    'etc/nuokeymgr', 'etc/nuokeymgr.bat']
+        return None
 
-        rmdir(self.pkgroot)
-        mkdir(self.pkgroot)
+    def requirements(self):
+        reqs = super(PyNuoadminPackage, self).requirements()
         if Globals.pythonversion < 3:
             # Unfortunately the latest pathlib2 requires typing, which breaks
             # p2<->p3 compatibility.  Force an older version.
-            # Double unfortunately, this doesn't work.  We pre-install the
-            # version we want, which SHOULD prevent pip from installing the
-            # newer version since this version is sufficient and the default
-            # upgrade strategy is "only-if-needed".  However, pip still
-            # decides to ALSO install pathlib2-2.3.7 so now there are TWO
-            # pathlib2 versions installed, and the "bad" one breaks things.
-            pipinstall('pathlib2 < 2.3.7', self.pkgroot)
-        pipinstall('%s[completion]==%s' % (self.__PKGNAME, pypi.version), self.pkgroot)
+            reqs.insert(0, 'pathlib2 < 2.3.7')
+        return reqs
 
     def install(self):
         nopyc = shutil.ignore_patterns('*.pyc', '*.pyo')
 
-        # We want all the packages, but not bin / etc / et.al.
-        files = os.listdir(self.pkgroot)
-        if 'bin' in files:
-            files.remove('bin')
-        if 'etc' in files:
-            files.remove('etc')
-
-        site = os.path.join('etc', 'python', 'site-packages')
-
-        self.stage.stage(site, files, ignore=nopyc)
-
-        # We don't want to list all the pip-installed site-lisp package content
-        for pth in files:
-            if 'pynuoadmin' not in pth:
-                self.stage.omitcontents.append(os.path.join(site, pth))
-                for f in getcontents(os.path.join(self.pkgroot, pth)):
-                    self.stage.omitcontents.append(os.path.join(site, pth, f))
-
-        # But, add the site-package root elements to the contents output
-        for pth in files:
-            if ('pynuoadmin' not in pth and 'dist-info' not in pth
-                    and 'egg-info' not in pth and not pth.endswith('.pyc')):
-                self.stage.extracontents.append(os.path.join(site, pth))
+        self.stage_site()
 
         nuodb = self.get_package('nuodb')
 
@@ -95,12 +71,50 @@ This pulls the latest version available from PyPI.
 
         # Always install sh scripts: Windows may  have a POSIX shell available
         self.stage.stage('bin', [os.path.join(Globals.bindir, 'nuocmd')])
-        self.stage.stagefiles('etc', os.path.join(nuodb.staged[0].basedir, 'etc'), ['run-java-app.sh', 'nuokeymgr'])
+        self.stage.stagefiles('etc', os.path.join(nuodb.staged[0].basedir, 'etc'), ['nuokeymgr'])
+        # Use our launcher, which caches the Java it finds, as nuodbmgr does
+        self.stage.stage('etc', [os.path.join(Globals.etcdir, 'run-java-app.sh')])
 
         if Globals.target.startswith('win'):
             self.stage.stage('bin', [os.path.join(Globals.bindir, 'nuocmd.bat')])
             self.stage.stagefiles('etc', os.path.join(nuodb.staged[0].basedir, 'etc'), ['nuokeymgr.bat'])
 
+    def finalize(self):
+        super(PyNuoadminPackage, self).finalize()
+        if Globals.appcds and Globals.target.startswith('lin'):
+            createarchive(self.stage, os.path.join(self.stage.stagedir, 'jar', 'nuokeymanager.jar'),
+                          ['--help'])
+
+        if not Globals.precompile or not Globals.target.startswith('lin'):
+            return
+
+        # Show how much the bytecode helps: without it nuocmd compiles
+        # everything on each run from a read-only installation.
+        pythons = interpreters()
+        if not pythons:
+            return
+        version = max(pythons, key=lambda v: tuple(map(int, v.split('.'))))
+        # The pip packages in this bundle are installed together
+        stagedirs = [pkg.stage.stagedir for pkg in self.buildlist()
+                     if pkg.stage.bundle == self.stage.bundle]
+        env = dict(os.environ,
+                   PYTHONPATH=launchpath(stagedirs, version),
+                   PYTHONDONTWRITEBYTECODE='1')
+        python = pythons[version]
+        args = [python, '-m', 'pynuoadmin.nuocmd', '--help']
+        cached = startuptime(args, env)
+        emptydir = tempfile.mkdtemp()
+        try:
+            # Look for bytecode in an empty directory, and not in the zips
+            env['PYTHONPYCACHEPREFIX'] = emptydir
+            env['PYTHONPATH'] = launchpath(stagedirs)
+            uncached = startuptime(args, env)
+        finally:
+            rmdir(emptydir)
+        if cached is not None and uncached is not None:
+            info('{}: nuocmd --help takes {:.0f}ms precompiled, {:.0f}ms without'.format(
+                self.name, cached * 1000, uncached * 1000))
+
 
 # Create and register this package
 PyNuoadminPackage()
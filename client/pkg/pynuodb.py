@@ -2,17 +2,12 @@
 #
 # Add the nuodb-python client
 
-import os
-import shutil
-
-from client.artifact import PyPIMetadata
-from client.package import Package
+from client.pypackage import PipPackage
 from client.stage import Stage
-from client.utils import rmdir, mkdir, pipinstall, getcontents
 from client.bundles import Bundles
 
 
-class PyNuodbPackage(Package):
+class PyNuodbPackage(PipPackage):
     """Add the NuoDB nuodb-python client."""
 
     __PKGNAME = 'pynuodb'
@@ -33,34 +28,8 @@ class PyNuodbPackage(Package):
         # There's only one, make it simple
         self.stage = self.staged[0]
 
-    def unpack(self):
-        pypi = PyPIMetadata(self.__PKGNAME)
-        self.set_repo(pypi.friendlytitle, pypi.friendlyurl)
-        self.setversion(pypi.version)
-
-        rmdir(self.pkgroot)
-        mkdir(self.pkgroot)
-        pipinstall('%s==%s' % (self.__PKGNAME, pypi.version), self.pkgroot)
-
     def install(self):
-        files = os.listdir(self.pkgroot)
-
-        site = os.path.join('etc', 'python', 'site-packages')
-
-        self.stage.stage(site, files, ignore=shutil.ignore_patterns('*.pyc', '*.pyo'))
-
-        # We don't want to list all the pip-installed site-lisp package content
-        for pth in files:
-            if 'pynuodb' not in pth:
-                self.stage.omitcontents.append(os.path.join(site, pth))
-                for f in getcontents(os.path.join(self.pkgroot, pth)):
-                    self.stage.omitcontents.append(os.path.join(site, pth, f))
-
-        # But, add the site-package root elements to the contents output
-        for pth in files:
-            if ('pynuodb' not in pth and 'dist-info' not in pth
-                    and 'egg-info' not in pth and not pth.endswith('.pyc')):
-                self.stage.extracontents.append(os.path.join(site, pth))
+        self.stage_site()
 
 
 # Create and register this package
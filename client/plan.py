@@ -0,0 +1,123 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Show what a build would do, without doing it.
+#
+# With --plan the packages to build and their prerequisites are resolved as
+# Package.build_all() would, and for each one the state of its stages is
+# checked to show which steps would run:
+#
+#   download .. test    skipped if every stage is complete and the package
+#                       definition hasn't changed since (see Package.reusable())
+#   install, stage      always run
+#
+# Whether the downloads and the unpacked content are already cached is
+# shown too, as far as that's known without downloading anything.
+#
+# Each step is given an estimate of its time and of the bytes it writes,
+# from the history of previous builds: the median of the last few runs of
+# the same step (see client.resources).  Nothing is written by --plan.
+
+import os
+
+from client.exceptions import UnpackError
+from client.package import Package
+from client.resources import duration, historypath, loadhistory, estimatestep
+from client.unpackcache import UnpackCache
+from client.utils import Globals, info, archiveformat
+
+_MB = 1024.0 * 1024.0
+
+
+def _downloads(pkg):
+    """Describe what's already downloaded for PKG."""
+    dldir = os.path.join(Globals.downloadroot, pkg.name)
+    files = []
+    for root, _, names in os.walk(dldir):
+        files += [os.path.join(root, n) for n in names if not n.endswith('.sha256')]
+    if not files:
+        return 'nothing downloaded yet'
+    size = sum(os.path.getsize(f) for f in files)
+    return '{} files downloaded ({:.1f}MB)'.format(len(files), size / _MB)
+
+
+def _isarchive(path):
+    try:
+        return bool(archiveformat(path))
+    except (UnpackError, EnvironmentError):
+        return False
+
+
+def _unpackcache(pkg):
+    """Describe whether PKG's downloaded archives are in the unpack cache."""
+    dldir = os.path.join(Globals.downloadroot, pkg.name)
+    archives = []
+    for root, _, names in os.walk(dldir):
+        archives += [os.path.join(root, n) for n in names
+                     if not n.endswith('.sha256') and _isarchive(os.path.join(root, n))]
+    if not archives:
+        return ''
+    cache = UnpackCache()
+    members = pkg.extractfilter()
+    found = [cache.cached(a, members) for a in archives]
+    if any(found):
+        return 'in the unpack cache'
+    if None in found:
+        return 'unpack cache not known'
+    return 'not in the unpack cache'
+
+
+def _stagestate(pkg):
+    """Return the reasons why PKG's install can't be reused."""
+    reasons = []
+    for stg in pkg.staged:
+        if stg.completed:
+            continue
+        if os.path.exists(stg.stagefile):
+            reasons.append('{} changed since it was built'.format(stg.name))
+        else:
+            reasons.append('{} not built yet'.format(stg.name))
+    if not reasons and Globals.repack and pkg.repackable:
+        reasons.append('repacking')
+    return reasons
+
+
+def plan(pkglist):
+    """Print what building the packages PKGLIST would do."""
+    history = loadhistory(historypath())
+    totalsecs = 0.0
+    totalbytes = 0
+    unknown = 0
+
+    info("Plan for {} (history: {})".format(
+        Globals.target, historypath() if history else 'none'))
+    for name in Package.setbuildlist(pkglist):
+        pkg = Package.get_package(name)
+        pkg._setup()
+        reasons = _stagestate(pkg)
+        if pkg.reusable():
+            info('{}: reuse install'.format(name))
+        else:
+            info('{}: full build ({})'.format(name, ', '.join(reasons)))
+
+        notes = {'download': _downloads(pkg), 'unpack': _unpackcache(pkg)}
+        for step in Package.SKIPPABLE_STEPS + ['install', 'stage']:
+            if step in Package.SKIPPABLE_STEPS and pkg.reusable():
+                info('  {:<10} skip'.format(step))
+                continue
+            est = estimatestep(history, name, step)
+            if est is None:
+                unknown += 1
+                cost = 'no history'
+            else:
+                (secs, written) = est
+                totalsecs += secs or 0
+                totalbytes += written or 0
+                cost = '~{}'.format(duration(secs or 0))
+                if written:
+                    cost += ', ~{:.0f}MB written'.format(written / _MB)
+            note = notes.get(step)
+            info('  {:<10} run   {}{}'.format(step, cost, '  ({})'.format(note) if note else ''))
+
+    info('Estimated: {}, {:.0f}MB written{}'.format(
+        duration(totalsecs), totalbytes / _MB,
+        ' (and {} steps without history)'.format(unknown) if unknown else ''))
@@ -0,0 +1,166 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Report the progress of downloads while they run.
+#
+# Each download is a Transfer, which the downloading thread updates as data
+# arrives.  While any are running, a thread reports on all of them, as set
+# by Globals.progress:
+#
+#   tty         a status line that's rewritten in place twice a second
+#               (see client.utils.statusline()), which other output,
+#               from any thread, is written above
+#   log         a line every 10 seconds for each download that's still
+#               running, suitable for CI logs
+#   None        nothing
+#
+# 'auto' is 'tty' if standard output is a terminal, otherwise 'log'.  The
+# rate is measured over the last few seconds, so that a download that has
+# stalled shows as stalled rather than slow.  When several downloads run at
+# the same time their total is reported too.
+
+import sys
+import time
+import threading
+
+from collections import deque
+
+from client.utils import Globals, info, verbose, statusline
+
+_INTERVALS = {'tty': 0.5, 'log': 10.0}
+
+# Seconds of samples to measure the current rate over
+_WINDOW = 5.0
+
+# Seconds without any data before a download is reported as stalled
+_STALL = 15.0
+
+# Smaller downloads are only reported with --verbose
+_SMALL = 1024 * 1024
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+def _mb(size):
+    return '{:.1f}MB'.format(size / float(1024 * 1024))
+
+
+def _duration(secs):
+    secs = int(secs)
+    if secs >= 3600:
+        return '{}:{:02d}:{:02d}'.format(secs // 3600, secs // 60 % 60, secs % 60)
+    return '{}:{:02d}'.format(secs // 60, secs % 60)
+
+
+class Transfer(object):
+    """A download of NAME, of TOTAL bytes if that's known."""
+
+    def __init__(self, name, total=None):
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.started = _clock()
+        self.lastdata = self.started
+        self._samples = deque([(self.started, 0)])
+
+    def update(self, size):
+        """Record that SIZE more bytes have arrived."""
+        self.done += size
+        self.lastdata = _clock()
+
+    def rate(self, now):
+        """Return the recent rate in bytes per second."""
+        self._samples.append((now, self.done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= _WINDOW:
+            self._samples.popleft()
+        (then, done) = self._samples[0]
+        return (self.done - done) / (now - then) if now > then else 0.0
+
+    def status(self, now, rate):
+        if self.total:
+            text = '{:.1f}/{} ({}%)'.format(self.done / float(1024 * 1024), _mb(self.total),
+                                            self.done * 100 // self.total)
+        else:
+            text = _mb(self.done)
+        stalled = now - self.lastdata
+        if stalled >= _STALL:
+            return '{}, stalled for {:.0f}s'.format(text, stalled)
+        text += ', {}/s'.format(_mb(rate))
+        if self.total and rate > 0:
+            text += ', ETA {}'.format(_duration((self.total - self.done) / rate))
+        return text
+
+    def summary(self):
+        elapsed = max(_clock() - self.started, 0.001)
+        return 'Downloaded {}: {} in {:.1f}s ({}/s)'.format(
+            self.name, _mb(self.done), elapsed, _mb(self.done / elapsed))
+
+
+class Progress(object):
+    """The downloads that are running, and the thread that reports them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._transfers = []
+        self._thread = None
+
+    def _mode(self):
+        mode = Globals.progress
+        if mode == 'auto':
+            mode = 'tty' if sys.stdout.isatty() else 'log'
+        return mode if mode in _INTERVALS else None
+
+    def start(self, name, total=None):
+        """Return a new Transfer for NAME, and report it while it runs."""
+        transfer = Transfer(name, total)
+        mode = self._mode()
+        with self._lock:
+            self._transfers.append(transfer)
+            if mode is not None and self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(mode,))
+                self._thread.daemon = True
+                self._thread.start()
+        return transfer
+
+    def finish(self, transfer, failed=False):
+        """Stop reporting TRANSFER, and report how it went."""
+        with self._lock:
+            self._transfers.remove(transfer)
+            statusline('')
+        if failed:
+            return
+        if transfer.done >= _SMALL:
+            info(transfer.summary())
+        else:
+            verbose(transfer.summary())
+
+    def _run(self, mode):
+        interval = _INTERVALS[mode]
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._transfers:
+                    self._thread = None
+                    return
+                self._report(mode, list(self._transfers))
+
+    def _report(self, mode, transfers):
+        now = _clock()
+        rates = [t.rate(now) for t in transfers]
+        statuses = [(t.name, t.status(now, rate)) for t, rate in zip(transfers, rates)]
+        total = None
+        if len(transfers) > 1:
+            done = sum(t.done for t in transfers)
+            total = '{} downloads: {}, {}/s'.format(len(transfers), _mb(done), _mb(sum(rates)))
+
+        if mode == 'log':
+            for name, status in statuses:
+                info('Downloading {}: {}'.format(name, status))
+            if total:
+                info(total)
+            return
+
+        # info() clears the line while it writes, and draws it again after
+        statusline(total or 'Downloading {}: {}'.format(*statuses[0]))
+
+
+PROGRESS = Progress()
@@ -0,0 +1,194 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Prune unused content from the bundled Python packages.
+#
+# The pip packages bring in whole dependency trees, including tests, docs,
+# type stubs and optional backends that our tools never import.  With
+# --prune, the modules that can be imported are found by following the
+# import graph from the modules of our own distributions:
+#
+#   static      each module found is scanned for imports (modulefinder)
+#   trace       also run each entry point (e.g. "nuocmd --help") with the
+#               pip packages, and record every module it loads
+#
+# Modules that are not reached are removed from the stage, as are data
+# files in directories without any module that is reached, and type stubs.
+# Anything matching a pattern in the allowlist (client/prune-allowlist.txt)
+# is always kept: it's for content that's only loaded dynamically.
+
+import os
+import json
+import modulefinder
+import tempfile
+
+from client.utils import verbose, rmdir, loadfile, matchpath, runout, getcontents
+
+ALLOWLIST = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'prune-allowlist.txt')
+
+# Type information is not needed at run time
+_STUBS = ('.pyi', 'py.typed')
+
+# Run a module as __main__ and save the files of all the modules it loaded
+_TRACER = '''
+import atexit, json, runpy, sys
+(out, mod) = sys.argv[1:3]
+def save():
+    files = [getattr(m, '__file__', None) for m in list(sys.modules.values())]
+    with open(out, 'w') as f:
+        json.dump([f for f in files if f], f)
+atexit.register(save)
+sys.argv = [mod] + sys.argv[3:]
+runpy.run_module(mod, run_name='__main__', alter_sys=True)
+'''
+
+
+class _ModuleFinder(modulefinder.ModuleFinder):
+    """A ModuleFinder that doesn't fail on namespace packages."""
+
+    def find_module(self, name, path, parent=None):
+        try:
+            return modulefinder.ModuleFinder.find_module(self, name, path, parent)
+        except AttributeError:
+            # There's no loader for a namespace package
+            raise ImportError("No module named {}".format(name))
+
+
+def loadallowlist(path=ALLOWLIST):
+    """Return the patterns in the allowlist PATH."""
+    patterns = []
+    for line in loadfile(path).splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line:
+            patterns.append(line)
+    return patterns
+
+
+def modulename(relpath):
+    """Return the name of the module in RELPATH, relative to site-packages."""
+    parts = os.path.splitext(relpath)[0].split('/')
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+class ImportGraph(object):
+    """The files reached by importing modules from SITEROOT.
+
+    Files are described by their path relative to SITEROOT, using '/'.
+    """
+
+    def __init__(self, siteroot):
+        self.siteroot = siteroot
+        self.reached = set()
+        # Directories whose content is kept entirely
+        self.whole = set()
+        self._dirs = None
+
+    def _relpath(self, path):
+        rel = os.path.relpath(os.path.abspath(path), self.siteroot)
+        if rel.startswith(os.pardir):
+            return None
+        return rel.replace(os.sep, '/')
+
+    def scan(self, modules):
+        """Add what importing MODULES reaches, following static imports."""
+        finder = _ModuleFinder(path=[self.siteroot])
+        for name in modules:
+            try:
+                finder.import_hook(name)
+            except (ImportError, SyntaxError) as ex:
+                verbose("Cannot scan {}: {}".format(name, str(ex)))
+
+        # modulefinder doesn't understand namespace packages: keep all of
+        # the deepest directory that exists for anything it couldn't find,
+        # if it's not a regular package, and scan its modules as scripts.
+        for name in sorted(finder.badmodules):
+            rel = name.replace('.', '/')
+            while rel and not os.path.isdir(os.path.join(self.siteroot, rel)):
+                rel = rel.rpartition('/')[0]
+            if (not rel or rel in self.whole
+                    or os.path.exists(os.path.join(self.siteroot, rel, '__init__.py'))):
+                continue
+            self.whole.add(rel)
+            for f in sorted(getcontents(self.siteroot, rel)):
+                if f.endswith('.py'):
+                    try:
+                        finder.run_script(os.path.join(self.siteroot, f))
+                    except (ImportError, SyntaxError) as ex:
+                        verbose("Cannot scan {}: {}".format(f, str(ex)))
+
+        for mod in finder.modules.values():
+            if mod.__file__:
+                rel = self._relpath(mod.__file__)
+                if rel is not None:
+                    self.reached.add(rel)
+        self._dirs = None
+
+    def trace(self, python, args):
+        """Add the modules loaded by running module ARGS[0] with ARGS[1:]."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            out = os.path.join(tmpdir, 'modules.json')
+            env = dict(os.environ, PYTHONPATH=self.siteroot,
+                       PYTHONDONTWRITEBYTECODE='1')
+            (ret, _, err) = runout([python, '-c', _TRACER, out] + list(args), env=env)
+            if ret != 0:
+                verbose("{} exited with {}:\n{}".format(' '.join(args), ret, err))
+            if not os.path.exists(out):
+                verbose("No modules were recorded from {}".format(' '.join(args)))
+                return
+            for path in json.loads(loadfile(out)):
+                rel = self._relpath(path)
+                if rel is not None:
+                    self.reached.add(rel)
+            self._dirs = None
+        finally:
+            rmdir(tmpdir)
+
+    def keep(self, rel, allowlist):
+        """Return True if the site-packages file REL should be kept."""
+        if matchpath(rel, allowlist) or matchpath(rel, self.whole):
+            return True
+        if rel.endswith(_STUBS):
+            return False
+        if rel in self.reached:
+            return True
+        if rel.endswith('.py'):
+            return False
+        # Data files are kept with the modules that may use them, apart
+        # from at the top level
+        if self._dirs is None:
+            self._dirs = set(r.rpartition('/')[0] for r in self.reached)
+        dirname = rel.rpartition('/')[0]
+        return bool(dirname) and dirname in self._dirs
+
+
+def prune(sitedir, graph, keep, allowlist):
+    """Remove the files in SITEDIR that GRAPH does not need.
+
+    Files below the top-level entries in KEEP are never removed.  Returns
+    the sorted removed paths relative to SITEDIR, and their total size.
+    """
+    removed = []
+    size = 0
+    for root, dirs, files in os.walk(sitedir):
+        rel = os.path.relpath(root, sitedir).replace(os.sep, '/')
+        if rel == '.':
+            dirs[:] = [d for d in dirs if d not in keep]
+            files = [f for f in files if f not in keep]
+            rel = ''
+        else:
+            rel += '/'
+        for f in files:
+            if not graph.keep(rel + f, allowlist):
+                path = os.path.join(root, f)
+                size += os.lstat(path).st_size
+                os.remove(path)
+                removed.append(rel + f)
+
+    # Remove any directories that are now empty
+    for root, dirs, files in os.walk(sitedir, topdown=False):
+        if root != sitedir and not os.listdir(root):
+            os.rmdir(root)
+    return (sorted(removed), size)
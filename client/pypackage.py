@@ -0,0 +1,479 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Base class for packages installed from PyPI.
+#
+# The Python packages depend on each other (pynuoadmin uses pynuodb, etc.)
+# so rather than each installing itself and all its dependencies into its
+# own pkgroot, all the pip packages being built are installed with a single
+# pip command into one shared directory.
+#
+# Each stage then stages the distributions it needs: its own and those it
+# requires (from the dist-info METADATA), apart from those already staged by
+# a package built before it in the same bundle.  The files of each
+# distribution are taken from its dist-info RECORD.
+#
+# With --zip-python the content of each stage that can be imported from a
+# zip is moved into etc/python/zip/<stage>.zip, so that nuocmd opens one
+# file rather than statting and opening hundreds of them.  With --precompile
+# the bytecode for each Python version goes in etc/python/zip/<X.Y>/<stage>.zip
+# without the sources, ahead of them on the path: zipimport only looks for
+# bytecode next to the source, so the zips can't share it like __pycache__.
+#
+# With --prune, content that our own distributions never import is removed
+# from the stages first (see client.prune).
+
+import os
+import re
+import shutil
+import stat
+import time
+import threading
+import zipfile
+
+from email.parser import Parser
+
+from client.archive import normmode
+from client.artifact import PyPIMetadata
+from client.package import Package
+from client.prune import ImportGraph, loadallowlist, modulename, prune
+from client.utils import Globals, info, verbose, rmdir, mkdir, rmfile, rmrf
+from client.utils import getcontents, savefile, which, run, runout, pipinstall
+
+_REQNAME = re.compile(r'\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?')
+_EXTRA = re.compile(r'''extra\s*==\s*['"]([^'"]+)['"]''')
+
+# Where the pip packages are installed in each stage
+SITE = os.path.join('etc', 'python', 'site-packages')
+
+# Where zipped site-packages content is installed in each stage
+ZIPDIR = os.path.join('etc', 'python', 'zip')
+
+# Extension modules can't be imported from a zip
+_NATIVE = ('.so', '.pyd', '.dll', '.dylib')
+
+# Zip files cannot represent times before 1980
+_ZIP_MINTIME = (1980, 1, 1, 0, 0, 0)
+
+# Python versions to precompile bytecode for, with --precompile
+PRECOMPILE_VERSIONS = ['3.8', '3.9', '3.10', '3.11', '3.12', '3.13']
+
+# How many times to run a command when measuring its startup time
+_STARTUP_RUNS = 5
+
+
+def normname(name):
+    """Return the normalized form of distribution NAME."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def interpreters():
+    """Return {version: python} for the PRECOMPILE_VERSIONS installed."""
+    found = {}
+    for version in PRECOMPILE_VERSIONS:
+        py = which('python' + version)
+        if py is None:
+            continue
+        # Wrappers (such as pyenv shims) may exist for missing versions
+        (ret, out, _) = runout([py, '-c', 'import sys; print("%d.%d" % sys.version_info[:2])'])
+        if ret == 0 and out.strip() == version:
+            found[version] = py
+    return found
+
+
+def _compilers():
+    pythons = interpreters()
+    if not pythons:
+        info("No Python {} interpreters found: not precompiling".format(
+            ', '.join(PRECOMPILE_VERSIONS)))
+    return sorted(pythons.items())
+
+
+def _compileall(py, sitedir, ddir, legacy=False):
+    # The bytecode is deterministic: pycs are validated by the hash of their
+    # source, which is never checked, rather than by timestamp.  Paths are
+    # recorded relative to the installation, not the build.
+    run([py, '-m', 'compileall', '-q', '-j', str(Globals.jobs)]
+        + (['-b'] if legacy else [])
+        + ['--invalidation-mode', 'unchecked-hash',
+           '-d', ddir.replace(os.sep, '/'), sitedir])
+
+
+def precompile(sitedir):
+    """Compile the bytecode of everything in SITEDIR for each interpreter."""
+    for version, py in _compilers():
+        verbose("Precompiling {} for Python {}".format(sitedir, version))
+        _compileall(py, sitedir, SITE)
+
+
+def launchpath(stagedirs, version=None):
+    """Return the PYTHONPATH bin/nuocmd uses for Python VERSION.
+
+    STAGEDIRS are the stages that are installed together.
+    """
+    zipdirs = ([os.path.join(ZIPDIR, version)] if version else []) + [ZIPDIR]
+    path = []
+    for zipdir in zipdirs:
+        for stagedir in stagedirs:
+            dirname = os.path.join(stagedir, zipdir)
+            if os.path.isdir(dirname):
+                path += [os.path.join(dirname, f) for f in sorted(os.listdir(dirname))
+                         if f.endswith('.zip')]
+    return os.pathsep.join(path + [os.path.join(d, SITE) for d in stagedirs])
+
+
+def zippable(path):
+    """Return True if the site-packages entry PATH can be imported from a zip."""
+    if not os.path.isdir(path):
+        # .pth files are only processed in site directories
+        return not path.endswith(_NATIVE + ('.pth',))
+    for _, _, files in os.walk(path):
+        if any(f.endswith(_NATIVE) for f in files):
+            return False
+    return True
+
+
+def writezip(zippath, rootdir, entries, select=None):
+    """Write the ENTRIES of ROOTDIR, and everything below them, to ZIPPATH.
+
+    Only names for which SELECT(name) is true are included.  The zip is
+    reproducible, like the package archives.
+    """
+    date_time = max(time.gmtime(Globals.source_date_epoch or 0)[:6], _ZIP_MINTIME)
+    names = []
+    for entry in entries:
+        path = os.path.join(rootdir, entry)
+        if not os.path.isdir(path):
+            names.append(entry)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if d != '__pycache__']
+            rel = os.path.relpath(root, rootdir).replace(os.sep, '/')
+            names.append(rel + '/')
+            names += ['{}/{}'.format(rel, f) for f in files]
+
+    mkdir(os.path.dirname(zippath))
+    with zipfile.ZipFile(zippath, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(names):
+            if select is not None and not select(name):
+                continue
+            isdir = name.endswith('/')
+            zinfo = zipfile.ZipInfo(name, date_time)
+            # Always claim UNIX so that the result doesn't depend on the build host
+            zinfo.create_system = 3
+            if isdir:
+                zinfo.external_attr = ((stat.S_IFDIR | 0o755) << 16) | 0x10
+                zf.writestr(zinfo, b'')
+                continue
+            path = os.path.join(rootdir, *name.split('/'))
+            zinfo.external_attr = (stat.S_IFREG | normmode(os.stat(path).st_mode)) << 16
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as f:
+                zf.writestr(zinfo, f.read())
+
+
+def startuptime(args, env):
+    """Return the median wall time of running ARGS with ENV, in seconds."""
+    times = []
+    for _ in range(_STARTUP_RUNS):
+        start = time.time()
+        (ret, out, err) = runout(args, env=env)
+        if ret != 0:
+            verbose("{} failed:\n{}{}".format(' '.join(args), out, err))
+            return None
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def distributions(siteroot):
+    """Return the distributions installed in SITEROOT.
+
+    Returns {normalized name: (requirements, top-level entries)} where the
+    requirements are (name, extras, marker extra) tuples from Requires-Dist.
+    """
+    dists = {}
+    for entry in sorted(os.listdir(siteroot)):
+        if not entry.endswith('.dist-info'):
+            continue
+        infodir = os.path.join(siteroot, entry)
+        with open(os.path.join(infodir, 'METADATA')) as f:
+            meta = Parser().parse(f, headersonly=True)
+        requires = []
+        for req in meta.get_all('Requires-Dist') or []:
+            (spec, _, marker) = req.partition(';')
+            m = _REQNAME.match(spec)
+            if m is None:
+                continue
+            extras = [e.strip() for e in (m.group(2) or '').split(',') if e.strip()]
+            extra = _EXTRA.search(marker)
+            requires.append((normname(m.group(1)), extras,
+                             extra.group(1) if extra else None))
+
+        toplevel = set([entry])
+        record = os.path.join(infodir, 'RECORD')
+        if os.path.exists(record):
+            with open(record) as f:
+                for line in f:
+                    path = line.rsplit(',', 2)[0]
+                    top = path.split('/', 1)[0]
+                    # Scripts and data files are installed outside the target
+                    if top and top not in ('..', '__pycache__'):
+                        toplevel.add(top)
+        dists[normname(meta['Name'])] = (requires, toplevel)
+    return dists
+
+
+class PipPackage(Package):
+    """Base class for a package installed from PyPI with pip.
+
+    Subclasses have a single stage, self.stage.
+    """
+
+    # Set once the pip packages have been installed by this build
+    _installed = False
+
+    # Held while installing the pip packages or tracing their imports,
+    # which all the pip packages share when they are built concurrently
+    _lock = threading.Lock()
+
+    # The import graph of the pip packages of each bundle, with --prune
+    _graphs = {}
+
+    # Module and arguments to run, to trace the modules it imports
+    traceruns = []
+
+    def __init__(self, name, distname=None, extras=None):
+        super(PipPackage, self).__init__(name)
+        self.distname = distname or name
+        self.extras = list(extras or [])
+        self._pypi = None
+
+    @staticmethod
+    def siteroot():
+        """Return the directory all pip packages are installed into."""
+        return os.path.join(Globals.pkgroot, 'python')
+
+    @staticmethod
+    def buildlist():
+        """Return the pip packages being built, in build order."""
+        return [pkg for pkg in map(Package.get_package, Package.get_buildlist())
+                if isinstance(pkg, PipPackage)]
+
+    @staticmethod
+    def registered():
+        """Return all the pip packages, whether they are being built or not."""
+        return [pkg for pkg in map(Package.get_package, sorted(Package.get_packages()))
+                if isinstance(pkg, PipPackage)]
+
+    def pypi(self):
+        if self._pypi is None:
+            self._pypi = PyPIMetadata(self.distname)
+        return self._pypi
+
+    def requirements(self):
+        """Return the pip requirements of this package."""
+        extras = '[{}]'.format(','.join(self.extras)) if self.extras else ''
+        return ['{}{}=={}'.format(self.distname, extras, self.pypi().version)]
+
+    def unpack(self):
+        pypi = self.pypi()
+        self.set_repo(pypi.friendlytitle, pypi.friendlyurl)
+        self.setversion(pypi.version)
+
+        with PipPackage._lock:
+            if PipPackage._installed:
+                verbose("{} was installed with the other pip packages".format(self.name))
+                return
+
+            # Install every pip package, so that any of them can be staged
+            # from the siteroot by a later build of only some of them
+            requirements = []
+            for pkg in self.registered():
+                requirements += [r for r in pkg.requirements() if r not in requirements]
+            siteroot = self.siteroot()
+            rmdir(siteroot)
+            mkdir(siteroot)
+            pipinstall(requirements, siteroot)
+            PipPackage._installed = True
+
+            # The other pip packages were staged from the siteroot that's
+            # been replaced, so none of them can be reused now
+            for pkg in self.registered():
+                if pkg is self:
+                    continue
+                pkg._setup()
+                for stg in pkg.staged:
+                    if stg.completed:
+                        verbose("{}: {} must be staged again".format(pkg.name, stg.name))
+                    rmfile(stg.stagefile)
+                    stg.reset()
+
+    def reusable(self):
+        # The pip packages being built share one siteroot, which is
+        # installed again if any of them isn't reused: then none can be.
+        for pkg in set(self.buildlist() + [self]):
+            pkg._setup()
+            if not Package.reusable(pkg):
+                return False
+        return True
+
+    def _closure(self, dists):
+        """Return the distributions this package needs, in DISTS."""
+        needed = set()
+        todo = [(normname(self.distname), self.extras)]
+        while todo:
+            (name, extras) = todo.pop()
+            if name in needed or name not in dists:
+                continue
+            needed.add(name)
+            for req, reqextras, extra in dists[name][0]:
+                if extra is None or extra in extras:
+                    todo.append((req, reqextras))
+        return needed
+
+    def owned(self):
+        """Return the top-level site-packages entries this package stages."""
+        dists = distributions(self.siteroot())
+        staged = set()
+        for pkg in self.buildlist():
+            needed = pkg._closure(dists)
+            if pkg is self:
+                break
+            if pkg.stage.bundle == self.stage.bundle:
+                staged |= needed
+        else:
+            # Not being built: stage everything it needs
+            needed = self._closure(dists)
+
+        entries = set()
+        for name in needed - staged:
+            entries |= dists[name][1]
+        entries.discard('bin')
+        entries.discard('etc')
+        return sorted(entries)
+
+    def importgraph(self):
+        """Return the ImportGraph of the pip packages in this bundle.
+
+        It's traced from the modules of each package's own distribution.
+        """
+        with PipPackage._lock:
+            return self._importgraph()
+
+    def _importgraph(self):
+        bundle = self.stage.bundle
+        if str(bundle) in PipPackage._graphs:
+            return PipPackage._graphs[str(bundle)]
+
+        siteroot = self.siteroot()
+        pkgs = [p for p in self.buildlist() if p.stage.bundle == bundle]
+        if self not in pkgs:
+            pkgs.append(self)
+        dists = distributions(siteroot)
+        modules = []
+        for pkg in pkgs:
+            for top in sorted(dists.get(normname(pkg.distname), ([], []))[1]):
+                for f in [top] + getcontents(siteroot, top):
+                    f = f.replace(os.sep, '/')
+                    if f.endswith('.py') and '-' not in f:
+                        modules.append(modulename(f))
+
+        graph = ImportGraph(siteroot)
+        verbose("Scanning imports of {} modules".format(len(modules)))
+        graph.scan(modules)
+        if Globals.prune == 'trace':
+            python = which('python3') or Globals.python
+            for pkg in pkgs:
+                for args in pkg.traceruns:
+                    verbose("Tracing imports of {}".format(' '.join(args)))
+                    graph.trace(python, args)
+        PipPackage._graphs[str(bundle)] = graph
+        return graph
+
+    def prunesite(self):
+        """Remove the staged site-packages content that's never imported."""
+        sitedir = os.path.join(self.stage.stagedir, SITE)
+        own = distributions(self.siteroot()).get(normname(self.distname), ([], []))[1]
+        (removed, size) = prune(sitedir, self.importgraph(), own, loadallowlist())
+        info('{}: Pruned {} files ({:.1f}MB)'.format(
+            self.name, len(removed), size / float(1024 * 1024)))
+
+        # Record what was removed, for review
+        report = os.path.join(Globals.targroot, 'prune', '{}.txt'.format(self.stage.name))
+        mkdir(os.path.dirname(report))
+        savefile(report, ''.join(f + '\n' for f in removed))
+        verbose("Pruned files are listed in {}".format(report))
+
+        gone = [f for f in self.stage.extracontents
+                if f.startswith(SITE) and not os.path.exists(os.path.join(self.stage.stagedir, f))]
+        for f in gone:
+            self.stage.extracontents.discard(f)
+
+    def finalize(self):
+        stagedir = self.stage.stagedir
+        sitedir = os.path.join(stagedir, SITE)
+        if Globals.prune and os.path.isdir(sitedir):
+            if Globals.pythonversion < 3:
+                info('{}: Not pruning Python 2 packages'.format(self.name))
+            else:
+                self.prunesite()
+        if Globals.zippython and os.path.isdir(sitedir):
+            info('{}: Zipping'.format(self.name))
+            self.zipsite()
+        if Globals.precompile and os.path.isdir(sitedir):
+            info('{}: Precompiling'.format(self.name))
+            precompile(sitedir)
+            # Don't list the bytecode in the stage contents
+            for f in getcontents(stagedir, SITE):
+                if f.endswith('.pyc'):
+                    self.stage.omitcontents.add(f)
+
+    def zipsite(self):
+        """Move the staged site-packages content that allows it into zips."""
+        stagedir = self.stage.stagedir
+        sitedir = os.path.join(stagedir, SITE)
+        entries = [e for e in sorted(os.listdir(sitedir))
+                   if zippable(os.path.join(sitedir, e))]
+        if not entries:
+            return
+        zipname = '{}.zip'.format(self.stage.name)
+        writezip(os.path.join(stagedir, ZIPDIR, zipname), sitedir, entries)
+
+        if Globals.precompile:
+            zipsrc = os.path.join(ZIPDIR, zipname)
+            for version, py in _compilers():
+                verbose("Precompiling {} for Python {}".format(zipname, version))
+                _compileall(py, sitedir, zipsrc, legacy=True)
+                # Package data is needed next to the bytecode, but the
+                # metadata is found in the source zip
+                writezip(os.path.join(stagedir, ZIPDIR, version, zipname),
+                         sitedir, entries,
+                         select=lambda n: not n.endswith('.py') and '.dist-info/' not in n)
+                for root, _, files in os.walk(sitedir):
+                    for f in files:
+                        if f.endswith('.pyc'):
+                            rmfile(os.path.join(root, f))
+
+        rmrf([os.path.join(sitedir, e) for e in entries])
+        if not os.listdir(sitedir):
+            os.rmdir(sitedir)
+        for e in entries:
+            self.stage.extracontents.discard(os.path.join(SITE, e))
+
+    def stage_site(self):
+        """Stage the site-packages content of this package."""
+        siteroot = self.siteroot()
+        files = self.owned()
+
+        self.stage.stage(SITE, [os.path.join(siteroot, f) for f in files],
+                         ignore=shutil.ignore_patterns('*.pyc', '*.pyo'))
+
+        # We don't want to list all the pip-installed site-lisp package content
+        for pth in files:
+            if self.name not in pth:
+                self.stage.omitcontents.add(os.path.join(SITE, pth))
+
+        # But, add the site-package root elements to the contents output
+        for pth in files:
+            if (self.name not in pth and 'dist-info' not in pth
+                    and 'egg-info' not in pth and not pth.endswith('.pyc')):
+                self.stage.extracontents.add(os.path.join(SITE, pth))
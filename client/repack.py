@@ -0,0 +1,359 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Stage content directly from a downloaded archive.
+#
+# Normally a package is unpacked into its pkgroot and then each stage copies
+# the files it wants from there.  With --repack, a Repacker is given the
+# same copy requests as Stage.complete() would perform, planned against an
+# index of the archive members rather than the file system.  Then a single
+# pass through the archive writes each member straight to every place it's
+# staged, without unpacking it first.
+#
+# The index of an archive is saved next to it as <archive>.index.json, so
+# that planning doesn't need an extra pass through the archive.
+
+import os
+import fnmatch
+import hashlib
+import json
+import posixpath
+import stat
+import time
+import zipfile
+
+from client.exceptions import UnpackError
+from client.utils import verbose, mkdir, loadfile, savefile, matchpath
+from client.utils import archiveformat, opentar, recorddigest
+from client.unpackcache import artifactdigest
+
+# Change this if the content of the index changes
+_INDEX_VERSION = 1
+
+_BUFSIZE = 1024 * 1024
+
+# Follow at most this many links when resolving a member
+_MAXLINKS = 20
+
+
+def _filemode(mode):
+    # Keep the permissions of the member, as unpack_file() does
+    return stat.S_IMODE(mode) & 0o755
+
+
+class ArchiveIndex(object):
+    """The members of the archive PATH below its top-level directory TOP.
+
+    Members are described by their path relative to TOP:
+      {'type': 'f', 'mode': <mode>, 'mtime': <time>}    regular file
+      {'type': 'd', 'mode': <mode>}                     directory
+      {'type': 'l', 'link': <target>}                   symbolic link
+      {'type': 'h', 'link': <member>}                   hard link
+    """
+
+    def __init__(self, path, top):
+        self.path = path
+        self.top = top
+        self.iszip = archiveformat(path) == 'zip'
+        self.members = self._load()
+        self._children = None
+
+    def _load(self):
+        sidecar = self.path + '.index.json'
+        digest = artifactdigest(self.path)
+        try:
+            saved = json.loads(loadfile(sidecar))
+            if (saved.get('version') == _INDEX_VERSION
+                    and saved.get('sha256') == digest
+                    and saved.get('top') == self.top):
+                return saved['members']
+        except (EnvironmentError, ValueError):
+            pass
+
+        verbose("Indexing {} ...".format(self.path))
+        members = self._scan()
+        savefile(sidecar, json.dumps({'version': _INDEX_VERSION,
+                                      'sha256': digest,
+                                      'top': self.top,
+                                      'members': members}))
+        return members
+
+    def relname(self, name):
+        """Return archive member NAME relative to the top, or None."""
+        name = name.rstrip('/')
+        if not name.startswith(self.top + '/'):
+            return None
+        return name[len(self.top)+1:]
+
+    def _scan(self):
+        members = {}
+        if self.iszip:
+            with zipfile.ZipFile(self.path) as zf:
+                for zinfo in zf.infolist():
+                    rel = self.relname(zinfo.filename)
+                    if not rel:
+                        continue
+                    mode = zinfo.external_attr >> 16 if zinfo.create_system == 3 else 0
+                    if zinfo.is_dir():
+                        members[rel] = {'type': 'd', 'mode': _filemode(mode) or 0o755}
+                    elif stat.S_ISLNK(mode):
+                        members[rel] = {'type': 'l',
+                                        'link': zf.read(zinfo).decode('utf-8')}
+                    else:
+                        members[rel] = {'type': 'f', 'mode': _filemode(mode) or 0o644,
+                                        'mtime': time.mktime(zinfo.date_time + (0, 0, -1))}
+        else:
+            with opentar(self.path) as tar:
+                for tinfo in tar:
+                    rel = self.relname(tinfo.name)
+                    if not rel:
+                        continue
+                    if tinfo.isdir():
+                        members[rel] = {'type': 'd', 'mode': _filemode(tinfo.mode)}
+                    elif tinfo.issym():
+                        members[rel] = {'type': 'l', 'link': tinfo.linkname}
+                    elif tinfo.islnk():
+                        members[rel] = {'type': 'h', 'link': self.relname(tinfo.linkname)}
+                    elif tinfo.isreg():
+                        members[rel] = {'type': 'f', 'mode': _filemode(tinfo.mode),
+                                        'mtime': tinfo.mtime}
+
+        # Archives don't always have entries for directories
+        for rel in list(members):
+            parent = posixpath.dirname(rel)
+            while parent and parent not in members:
+                members[parent] = {'type': 'd', 'mode': 0o755}
+                parent = posixpath.dirname(parent)
+        return members
+
+    def isdir(self, rel):
+        ent = self.members.get(rel)
+        return ent is not None and ent['type'] == 'd'
+
+    def listdir(self, rel):
+        """Return the sorted names of the members in the directory REL."""
+        if self._children is None:
+            self._children = {}
+            for name in self.members:
+                (parent, base) = posixpath.split(name)
+                self._children.setdefault(parent, []).append(base)
+        return sorted(self._children.get(rel, []))
+
+    def glob(self, pattern):
+        """Return the sorted members matching PATTERN, like glob.glob()."""
+        if pattern in self.members:
+            return [pattern]
+        parts = pattern.split('/')
+        found = []
+        for name in self.members:
+            names = name.split('/')
+            if len(names) == len(parts) and all(
+                    fnmatch.fnmatchcase(n, p) for n, p in zip(names, parts)):
+                found.append(name)
+        return sorted(found)
+
+    def resolve(self, rel):
+        """Return the regular file member that REL refers to, or None."""
+        for _ in range(_MAXLINKS):
+            ent = self.members.get(rel)
+            if ent is None or ent['type'] == 'd':
+                return None
+            if ent['type'] == 'f':
+                return rel
+            if ent['type'] == 'h':
+                rel = ent['link']
+            else:
+                rel = posixpath.normpath(posixpath.join(posixpath.dirname(rel), ent['link']))
+        return None
+
+
+class Repacker(object):
+    """Copy members of an archive to where they are staged, in one pass.
+
+    INDEX is the ArchiveIndex of the archive.  BASEDIR is where the archive
+    would have been unpacked: it's only used for the paths given to ignore
+    functions.
+    """
+
+    def __init__(self, index, basedir):
+        self.index = index
+        self.basedir = basedir
+        # Member -> destinations that get its content
+        self._files = {}
+        # Destination -> member, for everything written
+        self._outputs = {}
+        # Destination -> link target
+        self._links = {}
+        # Destination -> mode
+        self._dirs = {}
+        # Digests of the files written, as client.utils.copy() records them
+        self.digests = {}
+
+    def _exists(self, dst):
+        return (dst in self._dirs or dst in self._outputs or dst in self._links
+                or os.path.exists(dst))
+
+    def _ignored(self, ignore, rel, names):
+        if ignore is None:
+            return []
+        return ignore(os.path.join(self.basedir, *rel.split('/')), names)
+
+    def _addfile(self, rel, dst):
+        # Like shutil.copy2(): links are followed
+        real = self.index.resolve(rel)
+        if real is None:
+            raise UnpackError("Cannot resolve {} in {}".format(rel, self.index.path))
+        dests = self._files.setdefault(real, [])
+        if dst not in dests:
+            dests.append(dst)
+        self._outputs[dst] = real
+
+    def _addmember(self, rel, dst, ignore):
+        ent = self.index.members[rel]
+        if ent['type'] == 'd':
+            self._copytree(rel, dst, ignore)
+        elif ent['type'] == 'l':
+            self._links[dst] = ent['link']
+            self._outputs[dst] = rel
+        else:
+            self._addfile(rel, dst)
+
+    def _copytree(self, rel, dst, ignore):
+        # Like shutil.copytree(symlinks=True)
+        names = self.index.listdir(rel)
+        ignored = self._ignored(ignore, rel, names)
+        self._dirs[dst] = self.index.members[rel]['mode']
+        for name in names:
+            if name not in ignored:
+                self._addmember('{}/{}'.format(rel, name), os.path.join(dst, name), ignore)
+
+    def _copy(self, rel, dst, ignore):
+        # Like client.utils.copy()
+        if self.index.isdir(rel):
+            if self._exists(dst):
+                dst = os.path.join(dst, posixpath.basename(rel))
+                if self._exists(dst):
+                    self._copyinto(rel, dst, ignore)
+                    return
+            self._copytree(rel, dst, ignore)
+            return
+
+        groups = {}
+        for name in self.index.glob(rel):
+            (parent, base) = posixpath.split(name)
+            groups.setdefault(parent, []).append(base)
+        for parent, names in sorted(groups.items()):
+            ignored = self._ignored(ignore, parent, names)
+            for name in names:
+                if name not in ignored:
+                    self._addfile(posixpath.join(parent, name), os.path.join(dst, name))
+
+    def _copyinto(self, rel, dst, ignore):
+        for name in self.index.listdir(rel):
+            self._copy('{}/{}'.format(rel, name), dst, ignore)
+
+    def _copyoutputs(self, src, ddir, ignore):
+        # SRC is (a glob of) destinations that are already planned
+        (parent, pattern) = os.path.split(src)
+        names = sorted(os.path.basename(p) for p in self._outputs
+                       if os.path.dirname(p) == parent
+                       and fnmatch.fnmatchcase(os.path.basename(p), pattern))
+        if not names:
+            return False
+        ignored = ignore(parent, names) if ignore else []
+        for name in names:
+            if name not in ignored:
+                self._addfile(self._outputs[os.path.join(parent, name)],
+                              os.path.join(ddir, name))
+        return True
+
+    def add(self, src, ddir, ignore=None):
+        """Plan copying SRC into the directory DDIR as Stage.complete() does.
+
+        SRC is relative to the top of the archive, or is (a glob of) the
+        destination of an earlier add().  Returns False if it's neither:
+        then it must be copied from the file system.
+        """
+        if os.path.isabs(src):
+            return self._copyoutputs(src, ddir, ignore)
+        if src.endswith('/'):
+            self._copyinto(src[:-1], ddir, ignore)
+        else:
+            self._copy(src, ddir, ignore)
+        return True
+
+    def extract(self, patterns, destdir):
+        """Plan extracting the members selected by PATTERNS into DESTDIR.
+
+        See client.utils.matchpath() for PATTERNS.
+        """
+        for rel in sorted(self.index.members):
+            if not matchpath(rel, patterns):
+                continue
+            ent = self.index.members[rel]
+            dst = os.path.join(destdir, *rel.split('/'))
+            if ent['type'] == 'd':
+                self._dirs[dst] = ent['mode']
+            elif ent['type'] == 'l':
+                self._links[dst] = ent['link']
+                self._outputs[dst] = rel
+            else:
+                self._addfile(rel, dst)
+
+    def _write(self, fobj, rel, dests):
+        ent = self.index.members[rel]
+        outs = []
+        hfn = hashlib.sha256()
+        try:
+            for dst in dests:
+                outs.append(open(dst, 'wb'))
+            for data in iter(lambda: fobj.read(_BUFSIZE), b''):
+                hfn.update(data)
+                for out in outs:
+                    out.write(data)
+        finally:
+            for out in outs:
+                out.close()
+        for dst in dests:
+            os.chmod(dst, ent['mode'])
+            os.utime(dst, (ent['mtime'], ent['mtime']))
+            recorddigest(self.digests, dst, hfn.hexdigest())
+
+    def run(self):
+        """Write everything that's been planned."""
+        parents = set(os.path.dirname(d) for d in list(self._outputs) + list(self._links))
+        for dirname in sorted(parents | set(self._dirs)):
+            mkdir(dirname)
+        for dst, link in sorted(self._links.items()):
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.symlink(link, dst)
+
+        pending = dict(self._files)
+        size = 0
+        if self.index.iszip:
+            with zipfile.ZipFile(self.index.path) as zf:
+                for rel, dests in sorted(pending.items()):
+                    with zf.open('{}/{}'.format(self.index.top, rel)) as fobj:
+                        self._write(fobj, rel, dests)
+                    size += zf.getinfo('{}/{}'.format(self.index.top, rel)).file_size
+            pending = {}
+        else:
+            with opentar(self.index.path) as tar:
+                for tinfo in tar:
+                    dests = pending.pop(self.index.relname(tinfo.name), None)
+                    if dests and tinfo.isreg():
+                        self._write(tar.extractfile(tinfo), self.index.relname(tinfo.name), dests)
+                        size += tinfo.size
+                    if not pending:
+                        break
+        if pending:
+            raise UnpackError("Missing from {}: {}".format(
+                self.index.path, ', '.join(sorted(pending))))
+
+        # Set directory permissions last, in case they are not writable
+        for dirname, mode in sorted(self._dirs.items(), reverse=True):
+            os.chmod(dirname, mode)
+
+        verbose("Repacked {} members ({:.1f}MB) of {} to {} files".format(
+            len(self._files), size / float(1024 * 1024),
+            os.path.basename(self.index.path), len(self._outputs)))
@@ -0,0 +1,301 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Account for the resources used by each step of each package's build.
+#
+# For every step Package.build() runs, the following are recorded, so that
+# a build that runs out of memory or disk shows which step was responsible:
+#
+#   seconds         wall time
+#   maxrss_kb       peak RSS of the builder during the step, where Linux
+#                   allows the peak to be reset (otherwise only if the step
+#                   raised the peak so far)
+#   child_maxrss_kb largest peak RSS of the commands run during the step
+#                   (see client.utils.runcmd())
+#   read/written    bytes read from and written to storage by the builder
+#                   and the commands it ran (/proc/self/io)
+#   du              disk usage of the package's pkgroot, its stage
+#                   directories and its downloads, after the step
+#   free            free space on the file system of the build directory
+#
+# Values that can't be measured on the platform are null.  The steps are
+# listed at the end of the build, and saved in obj/<platform>/resources.json.
+# When packages are built concurrently (--jobs), the commands a step runs
+# are told apart by the context they're started in (commandcontext()), and
+# the peak RSS is only reset and recorded for a step that runs on its own.
+# A step that overlaps another is marked "overlapped": its maxrss_kb is
+# null, and read/written are those of its own thread (/proc/thread-self/io)
+# plus those of its commands.
+#
+# The time and bytes of the last few successful runs of each step are kept
+# in <downloadroot>/.history/<platform>.json, which outlives "build --clean",
+# to estimate how long a step will take (see client.plan and
+# client.schedule).
+
+import os
+import json
+import shutil
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+from client.utils import Globals, commandevents, commandcontext, mkdir, loadfile, savefile
+
+_clock = getattr(time, 'monotonic', time.time)
+
+_STEPS = []
+
+# The state of the steps that are being measured
+_ACTIVE = []
+_ACTIVE_LOCK = threading.Lock()
+
+_THREAD_IO = '/proc/thread-self/io'
+
+_MB = 1024.0 * 1024.0
+
+# The number of runs of each step to keep in the history
+HISTORY_RUNS = 5
+
+
+def _resetpeak():
+    """Reset the peak RSS of this process, if the OS allows it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except EnvironmentError:
+        return False
+
+
+def _peakrss():
+    """Return the peak RSS of this process in KiB, or None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (EnvironmentError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes rather than KiB
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def _iocounters(path='/proc/self/io'):
+    """Return (bytes read, bytes written) by this process and its children.
+
+    With _THREAD_IO, by the calling thread only.
+    """
+    counters = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                (key, _, val) = line.partition(':')
+                counters[key] = int(val)
+    except (EnvironmentError, ValueError):
+        return (None, None)
+    return (counters.get('read_bytes'), counters.get('write_bytes'))
+
+
+def diskusage(paths):
+    """Return the bytes of disk used by the files below PATHS."""
+    total = 0
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                try:
+                    st = os.lstat(os.path.join(root, name))
+                except OSError:
+                    continue
+                total += getattr(st, 'st_blocks', 0) * 512 or st.st_size
+    return total
+
+
+def _freespace(path):
+    """Return the free bytes on the file system PATH is (or will be) on."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    try:
+        return shutil.disk_usage(path).free
+    except (AttributeError, OSError):
+        return None
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return after - before
+
+
+def _sum(values):
+    if None in values[:1]:
+        return None
+    return sum(v for v in values if v is not None)
+
+
+@contextmanager
+def measure(package, step, dirs):
+    """Record the resources used by STEP of PACKAGE.
+
+    DIRS maps a label to the list of directories whose disk usage is
+    recorded after the step.
+    """
+    label = '{}/{}'.format(package, step)
+    state = {'overlapped': False}
+    with _ACTIVE_LOCK:
+        # The peak RSS is only reset, and measured, for a step on its own
+        for other in _ACTIVE:
+            other['overlapped'] = True
+        state['overlapped'] = bool(_ACTIVE)
+        _ACTIVE.append(state)
+        reset = not _ACTIVE[:-1] and _resetpeak()
+        before = _peakrss()
+        (read, written) = _iocounters()
+        (ownread, ownwritten) = _iocounters(_THREAD_IO)
+    started = _clock()
+    failed = True
+    try:
+        with commandcontext(label):
+            yield
+        failed = False
+    finally:
+        seconds = _clock() - started
+        with _ACTIVE_LOCK:
+            _ACTIVE.remove(state)
+            peak = _peakrss()
+            (read2, written2) = _iocounters()
+            (ownread2, ownwritten2) = _iocounters(_THREAD_IO)
+        children = [e for e in commandevents() if e.get('context') == label]
+        maxrss = [e['maxrss_kb'] for e in children if e.get('maxrss_kb') is not None]
+        if state['overlapped']:
+            # The process-wide values include the other steps': count this
+            # thread's own I/O and that of the commands the step ran
+            peak = None
+            read = _sum([_delta(ownread, ownread2)] + [e.get('read_bytes') for e in children])
+            written = _sum([_delta(ownwritten, ownwritten2)]
+                           + [e.get('written_bytes') for e in children])
+        else:
+            # Without a reset, only a peak above the one before is this step's
+            if not reset and peak == before:
+                peak = None
+            read = _delta(read, read2)
+            written = _delta(written, written2)
+        free = _freespace(Globals.tmproot or os.curdir)
+        _STEPS.append({
+            'package': package,
+            'step': step,
+            'failed': failed,
+            'overlapped': state['overlapped'],
+            'seconds': round(seconds, 3),
+            'maxrss_kb': peak,
+            'child_maxrss_kb': max(maxrss) if maxrss else None,
+            'read_bytes': read,
+            'written_bytes': written,
+            'du': dict((name, diskusage(paths)) for name, paths in dirs.items()),
+            'free_bytes': free})
+
+
+def duration(secs):
+    """Return SECS as e.g. '42s' or '3m05s'."""
+    secs = int(round(secs))
+    return '{}m{:02d}s'.format(secs // 60, secs % 60) if secs >= 60 else '{}s'.format(secs)
+
+
+def _mb(value, scale=_MB):
+    return '-' if value is None else '{:.0f}'.format(value / scale)
+
+
+def steps():
+    """Return the steps recorded so far."""
+    return list(_STEPS)
+
+
+def savesteps(path):
+    """Save the recorded steps as JSON in PATH."""
+    savefile(path, json.dumps({'steps': _STEPS}, indent=1, sort_keys=True) + '\n')
+
+
+def stepsummary():
+    """Return lines with a table of the recorded steps."""
+    if not _STEPS:
+        return []
+    labels = sorted(set(label for s in _STEPS for label in s['du']))
+    header = (['package', 'step', 'secs', 'rss MB', 'child MB', 'read MB', 'write MB']
+              + ['{} MB'.format(label) for label in labels] + ['free MB'])
+    rows = [header]
+    for s in _STEPS:
+        rows.append([s['package'],
+                     s['step'] + ('*' if s.get('overlapped') else '')
+                     + (' (failed)' if s['failed'] else ''),
+                     '{:.1f}'.format(s['seconds']),
+                     _mb(s['maxrss_kb'], 1024.0),
+                     _mb(s['child_maxrss_kb'], 1024.0),
+                     _mb(s['read_bytes']),
+                     _mb(s['written_bytes'])]
+                    + [_mb(s['du'].get(label)) for label in labels]
+                    + [_mb(s['free_bytes'])])
+    widths = [max(len(r[i]) for r in rows) for i in range(len(header))]
+    lines = ['Resources used by each step:']
+    for row in rows:
+        cells = [row[0].ljust(widths[0]), row[1].ljust(widths[1])]
+        cells += [c.rjust(w) for c, w in zip(row[2:], widths[2:])]
+        lines.append('  ' + '  '.join(cells).rstrip())
+    if any(s.get('overlapped') for s in _STEPS):
+        lines.append('  * ran alongside other steps: read and written are its own and its')
+        lines.append('    commands\', and the peak RSS of the builder is not known')
+    return lines
+
+
+def historypath():
+    """Return the path of the history of the steps for Globals.target."""
+    return os.path.join(Globals.downloadroot, '.history', '{}.json'.format(Globals.target))
+
+
+def loadhistory(path):
+    """Return the history in PATH as {package: {step: [run, ...]}}."""
+    try:
+        return json.loads(loadfile(path))
+    except (EnvironmentError, ValueError):
+        return {}
+
+
+def updatehistory(path, recorded):
+    """Add the successful steps in RECORDED (see steps()) to the history in PATH."""
+    recorded = [s for s in recorded if not s['failed']]
+    if not recorded:
+        return
+    history = loadhistory(path)
+    for s in recorded:
+        runs = history.setdefault(s['package'], {}).setdefault(s['step'], [])
+        runs.append({'seconds': s['seconds'],
+                     'read_bytes': s['read_bytes'],
+                     'written_bytes': s['written_bytes']})
+        del runs[:-HISTORY_RUNS]
+    mkdir(os.path.dirname(path))
+    savefile(path, json.dumps(history, indent=1, sort_keys=True) + '\n')
+
+
+def _median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+
+def estimatestep(history, package, step):
+    """Return (seconds, bytes written) expected for STEP of PACKAGE, or None."""
+    runs = history.get(package, {}).get(step)
+    if not runs:
+        return None
+    return (_median(r['seconds'] for r in runs),
+            _median(r['written_bytes'] for r in runs))
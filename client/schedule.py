@@ -0,0 +1,88 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Build packages concurrently, longest remaining path first.
+#
+# Package.build_all() runs up to Globals.jobs packages at a time.  A package
+# starts once all of its prerequisites (Package.prereqs()) have been built,
+# and when several are ready the one chosen is set by Globals.schedule:
+#
+#   critical    the one at the start of the longest chain of builds still
+#               to run, by the expected time of each build (from the history
+#               of previous builds, see client.resources), so that e.g. the
+#               NuoDB download and unpack that jdbc, odbc and pynuoadmin
+#               wait for starts before packages that nothing waits for
+#   order       the first in build order (Package.get_buildlist())
+#
+# Packages that have never been timed are expected to take as long as the
+# average of those that have.  If a build fails no more are started, and
+# the error is raised once those that are running have finished.
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from client.resources import duration
+from client.utils import Globals, info, verbose
+
+SCHEDULES = ['critical', 'order']
+
+
+def criticalpaths(order, prereqs, costs):
+    """Return {name: seconds} of the longest chain of builds from each of ORDER.
+
+    ORDER is in build order, PREREQS maps each name to the names it needs
+    and COSTS to the seconds its build is expected to take, or None.
+    """
+    known = [c for c in costs.values() if c is not None]
+    default = sum(known) / len(known) if known else 1.0
+    paths = {}
+    for name in reversed(order):
+        after = [paths[n] for n in order if name in prereqs[n]]
+        cost = costs[name] if costs[name] is not None else default
+        paths[name] = cost + max(after or [0.0])
+    return paths
+
+
+def runscheduled(order, prereqs, costs, func, workers):
+    """Call FUNC(name) for each of ORDER, at most WORKERS at a time.
+
+    A name is only started when FUNC has returned for all of its PREREQS
+    that are in ORDER (see criticalpaths() for the arguments).
+    """
+    if Globals.schedule == 'critical':
+        paths = criticalpaths(order, prereqs, costs)
+        priority = dict((n, (-paths[n], i)) for i, n in enumerate(order))
+        info('Critical path: ~{} ({})'.format(
+            duration(max(paths.values() or [0])),
+            ', '.join('{} ~{}'.format(n, duration(paths[n]))
+                      for n in sorted(order, key=priority.get))))
+    else:
+        priority = dict((n, i) for i, n in enumerate(order))
+
+    waiting = dict((n, set(p for p in prereqs[n] if p in order)) for n in order)
+    ready = [n for n in order if not waiting[n]]
+    running = {}
+    failed = None
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while ready or running:
+            while ready and len(running) < workers and failed is None:
+                ready.sort(key=priority.get)
+                name = ready.pop(0)
+                verbose('Starting {}'.format(name))
+                running[pool.submit(func, name)] = name
+            if not running:
+                break
+            (done, _) = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except Exception as ex:
+                    if failed is None:
+                        failed = ex
+                    continue
+                for other in order:
+                    if name in waiting[other]:
+                        waiting[other].discard(name)
+                        if not waiting[other]:
+                            ready.append(other)
+    if failed is not None:
+        raise failed
@@ -6,6 +6,8 @@ import json
 from client.utils import Globals, loadfile, savefile, getcontents
 from client.utils import mkdir, rmdir, rmfile, copy, copyinto
 from client.bundles import Bundles
+from client.manifest import treemanifest
+from client.pathset import PathSet
 
 class Stage(object):
     """Class representing the staged content of a client."""
@@ -20,12 +22,18 @@ class Stage(object):
     stagedir = None
     _staged = None
 
-    # Any files here will be omitted from the generated results
+    # Any files here will be omitted from the generated results.  This is a
+    # PathSet: omitting a directory omits everything below it.
     omitcontents = None
 
-    # Any files here will be added to the generated results
+    # Any files here will be added to the generated results (a PathSet)
     extracontents = None
 
+    # Digests of the files copied by complete(), and the resulting manifest
+    _digests = None
+    _repacker = None
+    _manifest = None
+
     def __init__(self, name, title=None, requirements=None, notes=None, bundle=None, package=None):
         self.name = name
         self.title = title
@@ -34,8 +42,8 @@ class Stage(object):
         self.bundle = bundle
         self.package = package
         self._staged = []
-        self.omitcontents = []
-        self.extracontents = []
+        self.omitcontents = PathSet()
+        self.extracontents = PathSet()
         self.repo_title = ""
         self.repo_url = ""
 
@@ -86,8 +94,14 @@ class Stage(object):
         rmfile(self.stagefile)
         rmdir(self.stagedir)
 
-    def complete(self):
+    def complete(self, repacker=None):
+        # With a REPACKER (see client.repack) content from the package's
+        # archive is only planned here: it's written by repacker.run().
+        # The caller must save() once the staged content is final.
         self.clean()
+        self._digests = {}
+        self._repacker = repacker
+        self._manifest = None
         for dat in self._staged:
             if dat[0] in ['doc', 'sample']:
                 ddir = os.path.join(self.stagedir, dat[0], self.name)
@@ -95,24 +109,41 @@ class Stage(object):
                 ddir = os.path.join(self.stagedir, dat[0])
             mkdir(ddir)
             for f in dat[1]:
+                if repacker is not None and repacker.add(f, ddir, ignore=dat[2]):
+                    continue
                 if not os.path.isabs(f):
                     f = os.path.join(self.basedir, f)
                 if f.endswith('/'):
-                    copyinto(f[:-1], ddir, ignore=dat[2])
+                    copyinto(f[:-1], ddir, ignore=dat[2], digests=self._digests)
                 else:
-                    copy(f, ddir, ignore=dat[2])
+                    copy(f, ddir, ignore=dat[2], digests=self._digests)
 
+    def save(self):
         self.completed = True
 
+        # Anything that was changed since it was copied is read again
+        self._manifest = None
+        self.getmanifest()
+
         # Save the details for the next run to avoid redoing it all
         vals = {}
         for key, val in self.__dict__.items():
             if val is not None and not key.startswith('_'):
-                vals[key] = val
+                vals[key] = list(val) if isinstance(val, PathSet) else val
 
         savefile(self.stagefile, json.dumps(vals))
 
     def getcontents(self):
         assert self.completed
         contents = getcontents(self.stagedir)
-        return [f for f in contents if f not in self.omitcontents] + self.extracontents
+        return [f for f in contents if f not in self.omitcontents] + list(self.extracontents)
+
+    def getmanifest(self):
+        """Return the manifest entries of the staged files (see client.manifest)."""
+        assert self.completed
+        if self._manifest is None:
+            digests = dict(self._digests or {})
+            if self._repacker is not None:
+                digests.update(self._repacker.digests)
+            self._manifest = treemanifest(self.stagedir, digests)
+        return self._manifest
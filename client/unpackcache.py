@@ -0,0 +1,242 @@
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Cache unpacked artifacts.
+#
+# Unpacking a large artifact (such as the NuoDB server package) takes longer
+# than anything else we do with it, so the unpacked trees are kept under
+# <downloadroot>/.unpack-cache, keyed by the digest of the artifact and the
+# extraction filter:
+#
+#   .unpack-cache/<key>/entry.json   artifact, filter and size of the tree
+#   .unpack-cache/<key>/tree/        the unpacked content
+#
+# A tree is unpacked into a temporary directory and renamed into place, so
+# partial trees are never used.  It's restored into the package root as a
+# farm of hard links, or of reflinked or plain copies where hard links are
+# not possible.  When the cache grows beyond Globals.unpack_cache_size MiB
+# the least recently used trees are removed, apart from those that are
+# being unpacked or restored by packages that are built concurrently.
+
+import os
+import errno
+import hashlib
+import json
+import shutil
+import stat
+import time
+import threading
+
+from client.utils import Globals, verbose, mkdir, rmdir, loadfile, savefile
+from client.utils import unpack_file
+
+# Change this if the way trees are unpacked changes, to invalidate them
+_CACHE_VERSION = '1'
+
+_BUFSIZE = 1024 * 1024
+
+# The keys of the trees that are being unpacked or restored
+_BUSY = set()
+_BUSY_LOCK = threading.Lock()
+
+# From linux/fs.h
+_FICLONE = 0x40049409
+
+
+def artifactdigest(path):
+    """Return the SHA-256 hex digest of the artifact PATH.
+
+    The digest is saved in PATH.sha256 and reused while the artifact's
+    size and modification time are unchanged.
+    """
+    st = os.stat(path)
+    sidecar = path + '.sha256'
+    try:
+        saved = json.loads(loadfile(sidecar))
+        if saved.get('size') == st.st_size and saved.get('mtime') == st.st_mtime:
+            return saved['sha256']
+    except (EnvironmentError, ValueError, KeyError):
+        pass
+
+    hfn = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(_BUFSIZE), b''):
+            hfn.update(data)
+    savefile(sidecar, json.dumps({'size': st.st_size, 'mtime': st.st_mtime,
+                                  'sha256': hfn.hexdigest()}))
+    return hfn.hexdigest()
+
+
+def _reflink(src, dst):
+    """Copy SRC to DST sharing its blocks if the filesystem allows it."""
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except (ImportError, EnvironmentError):
+        return False
+
+
+def _linkfile(src, dst):
+    try:
+        os.link(src, dst)
+    except (OSError, AttributeError):
+        if not _reflink(src, dst):
+            shutil.copy2(src, dst)
+
+
+def linkfarm(srcdir, dstdir):
+    """Recreate the tree SRCDIR in DSTDIR, hard linking the files."""
+    dirs = []
+    for root, dnames, fnames in os.walk(srcdir):
+        rel = os.path.relpath(root, srcdir)
+        dst = dstdir if rel == '.' else os.path.join(dstdir, rel)
+        mkdir(dst)
+        dirs.append((root, dst))
+        for name in dnames + fnames:
+            spath = os.path.join(root, name)
+            if os.path.islink(spath):
+                os.symlink(os.readlink(spath), os.path.join(dst, name))
+                if name in dnames:
+                    dnames.remove(name)
+            elif name in fnames:
+                _linkfile(spath, os.path.join(dst, name))
+    # Set directory permissions last, in case they are not writable
+    for src, dst in reversed(dirs):
+        shutil.copymode(src, dst)
+
+
+def _rmtree(dirname):
+    # Make sure that the directories are writable so we can empty them
+    for root, dnames, _ in os.walk(dirname):
+        for name in dnames:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):
+                os.chmod(path, stat.S_IMODE(os.lstat(path).st_mode) | stat.S_IRWXU)
+    rmdir(dirname)
+
+
+def _treesize(dirname):
+    size = 0
+    for root, _, fnames in os.walk(dirname):
+        for name in fnames:
+            size += os.lstat(os.path.join(root, name)).st_size
+    return size
+
+
+class UnpackCache(object):
+    """A cache of unpacked artifacts."""
+
+    def __init__(self, cachedir=None, budget=None):
+        if cachedir is None:
+            cachedir = os.path.join(Globals.downloadroot, '.unpack-cache')
+        if budget is None:
+            budget = Globals.unpack_cache_size
+        self.cachedir = cachedir
+        self.budget = budget * 1024 * 1024
+
+    def _key(self, path, members):
+        hfn = hashlib.sha256()
+        hfn.update(json.dumps([_CACHE_VERSION, artifactdigest(path),
+                               members]).encode('utf-8'))
+        return hfn.hexdigest()
+
+    def cached(self, path, members=None):
+        """Return True if the artifact PATH is in the cache, None if unknown.
+
+        Nothing is written: if the digest of PATH hasn't been saved yet (see
+        artifactdigest()) it's not computed.
+        """
+        if self.budget <= 0:
+            return False
+        try:
+            st = os.stat(path)
+            saved = json.loads(loadfile(path + '.sha256'))
+        except (EnvironmentError, ValueError):
+            return None
+        if saved.get('size') != st.st_size or saved.get('mtime') != st.st_mtime:
+            return None
+        hfn = hashlib.sha256()
+        hfn.update(json.dumps([_CACHE_VERSION, saved.get('sha256'),
+                               members]).encode('utf-8'))
+        entrydir = os.path.join(self.cachedir, hfn.hexdigest())
+        return (os.path.isdir(os.path.join(entrydir, 'tree'))
+                and os.path.exists(os.path.join(entrydir, 'entry.json')))
+
+    def unpack(self, path, dest, members=None):
+        """Unpack the artifact PATH into DEST (see unpack_file())."""
+        if self.budget <= 0:
+            unpack_file(path, dest, members)
+            return
+
+        key = self._key(path, members)
+        entrydir = os.path.join(self.cachedir, key)
+        tree = os.path.join(entrydir, 'tree')
+        entryfile = os.path.join(entrydir, 'entry.json')
+
+        with _BUSY_LOCK:
+            _BUSY.add(key)
+        try:
+            if os.path.isdir(tree) and os.path.exists(entryfile):
+                verbose("Restoring {} from unpack cache {}".format(
+                    os.path.basename(path), key[:12]))
+            else:
+                _rmtree(entrydir)
+                tmp = os.path.join(self.cachedir, '{}.tmp'.format(key))
+                _rmtree(tmp)
+                unpack_file(path, tmp, members)
+                mkdir(entrydir)
+                os.rename(tmp, tree)
+                savefile(entryfile, json.dumps({'artifact': os.path.basename(path),
+                                                'members': members,
+                                                'size': _treesize(tree)}))
+
+            # The modification time of the entry records when it was last used
+            os.utime(entryfile, None)
+            mkdir(dest)
+            linkfarm(tree, dest)
+        finally:
+            with _BUSY_LOCK:
+                _BUSY.discard(key)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Remove least recently used trees until the cache is within budget.
+
+        The tree KEEP is never removed, nor are trees in use.
+        """
+        with _BUSY_LOCK:
+            self._evict(keep)
+
+    def _evict(self, keep):
+        entries = []
+        total = 0
+        for key in os.listdir(self.cachedir) if os.path.isdir(self.cachedir) else []:
+            # Trees in use count towards the budget but can't be removed
+            busy = key.split('.')[0] in _BUSY
+            entryfile = os.path.join(self.cachedir, key, 'entry.json')
+            try:
+                size = json.loads(loadfile(entryfile))['size']
+                used = os.path.getmtime(entryfile)
+            except (EnvironmentError, ValueError, KeyError) as ex:
+                if busy:
+                    continue
+                if getattr(ex, 'errno', None) != errno.ENOENT:
+                    verbose("Invalid unpack cache entry {}: {}".format(key, str(ex)))
+                # Left over from an interrupted build
+                _rmtree(os.path.join(self.cachedir, key))
+                continue
+            total += size
+            if not busy:
+                entries.append((used, key, size))
+
+        for used, key, size in sorted(entries):
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            verbose("Evicting unpack cache {} (last used {})".format(
+                key[:12], time.strftime('%Y-%m-%d %H:%M', time.localtime(used))))
+            _rmtree(os.path.join(self.cachedir, key))
+            total -= size
@@ -2,12 +2,17 @@
 
 __all__ = ['Globals', 'info', 'verbose', 'error',
            'mkdir', 'rmrf', 'rmdir', 'rmfile', 'rmfiles',
-           'copy', 'copyinto', 'copyfiles', 'getcontents',
-           'loadfile', 'savefile', 'unpack_file',
-           'which', 'runcmd', 'run', 'runout', 'pipinstall']
+           'copy', 'copyinto', 'copyfiles', 'recorddigest', 'getcontents',
+           'loadfile', 'savefile', 'unpack_file', 'matchpath',
+           'archiveformat', 'opentar',
+           'which', 'runcmd', 'run', 'runout', 'commandevents', 'commandsummary',
+           'pipinstall',
+           'cpuslot', 'parallel']
 
 import os
 import errno
+import hashlib
+import json
 import re
 import shutil
 import signal
@@ -15,6 +20,15 @@ import stat
 import subprocess
 import sys
 import glob
+import fnmatch
+import tarfile
+import threading
+import time
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 
 from client.exceptions import UnpackError, CommandError
 
@@ -40,6 +54,48 @@ class Globals(object):
 
     target = None
 
+    # Timestamp used for archive entries and generated content
+    source_date_epoch = None
+
+    # Maximum number of CPU-bound tasks to run at the same time
+    jobs = os.cpu_count() or 1
+
+    # Disk space (MiB) for unpacked artifacts kept between builds
+    unpack_cache_size = 4096
+
+    # Stage content straight from downloaded archives (see client.repack)
+    repack = False
+
+    # Install Python packages from a local wheelhouse (see pipinstall())
+    wheelhouse = True
+
+    # Days after which a wheelhouse is filled again, so that unpinned
+    # dependencies get their fixes; 0 refills it on every build
+    wheelhouse_max_age = 7
+
+    # Ship precompiled bytecode for the Python packages
+    precompile = False
+
+    # Ship the Python packages as zips (see client.pypackage)
+    zippython = False
+
+    # Remove unused Python modules: None, 'static' or 'trace' (see client.prune)
+    prune = None
+
+    # Create class data sharing archives for the Java tools (see client.appcds)
+    appcds = False
+
+    # JSONL file that every subprocess is recorded in (see runcmd())
+    commandlog = None
+
+    # How to report download progress: 'auto', 'tty', 'log' or None
+    # (see client.progress)
+    progress = 'auto'
+
+    # Which ready package to build next: 'critical' or 'order'
+    # (see client.schedule)
+    schedule = 'critical'
+
     isverbose = False
     iswindows = sys.platform == 'win32'
 
@@ -82,6 +138,8 @@ class Globals(object):
             cls.pkgroot = os.path.join(cls.targroot, 'pkg')
         if cls.stageroot is None:
             cls.stageroot = os.path.join(cls.targroot, 'stage')
+        if cls.commandlog is None:
+            cls.commandlog = os.path.join(cls.targroot, 'commands.jsonl')
 
         if cls.iswindows:
             cls.libdir = 'lib'
@@ -132,11 +190,42 @@ class Globals(object):
             if cls.cxx is None:
                 cls.cxx = which('c++')
 
+
 # ----- Information
 
+# Output is written under this lock, so that lines from different threads
+# don't mix.  A status line (see statusline()) is cleared before each line
+# and drawn again after it.
+_OUTPUT_LOCK = threading.Lock()
+_STATUS = {'line': ''}
+
+
+def _write(stream, text):
+    with _OUTPUT_LOCK:
+        line = _STATUS['line']
+        if line:
+            sys.stdout.write('\r' + ' ' * len(line) + '\r')
+            sys.stdout.flush()
+        stream.write(text+"\n")
+        stream.flush()
+        if line:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+
+def statusline(text):
+    """Show TEXT in place on the last line of the output, or clear it if empty."""
+    with _OUTPUT_LOCK:
+        old = _STATUS['line']
+        if not text and not old:
+            return
+        sys.stdout.write('\r' + text.ljust(len(old)) + ('' if text else '\r'))
+        sys.stdout.flush()
+        _STATUS['line'] = text
+
+
 def info(text):
-    sys.stdout.write(text+"\n")
-    sys.stdout.flush()
+    _write(sys.stdout, text)
 
 
 def verbose(text):
@@ -145,8 +234,47 @@ def verbose(text):
 
 
 def error(text):
-    sys.stderr.write(text+"\n")
-    sys.stderr.flush()
+    _write(sys.stderr, text)
+
+
+# ----- Concurrency
+
+_CPU_SLOTS = None
+_CPU_SLOTS_LOCK = threading.Lock()
+
+
+def cpuslot():
+    """Return a context manager that holds one slot of the CPU budget.
+
+    All CPU-bound work shares the Globals.jobs budget, however it is nested.
+    Only hold a slot around work that doesn't wait for other slots.
+    """
+    global _CPU_SLOTS
+    with _CPU_SLOTS_LOCK:
+        if _CPU_SLOTS is None:
+            _CPU_SLOTS = threading.BoundedSemaphore(max(1, int(Globals.jobs)))
+    return _CPU_SLOTS
+
+
+def parallel(func, items):
+    """Call FUNC for each of ITEMS concurrently and return the results.
+
+    The results are in the same order as ITEMS.  If any call raises an
+    exception it is re-raised here once all calls have completed.
+    """
+    items = list(items)
+    if len(items) < 2 or int(Globals.jobs) < 2:
+        return [func(item) for item in items]
+
+    # The processes started by the calls belong to the caller's context
+    context = currentcontext()
+
+    def call(item):
+        with commandcontext(context):
+            return func(item)
+
+    with ThreadPoolExecutor(max_workers=min(len(items), int(Globals.jobs))) as pool:
+        return list(pool.map(call, items))
 
 
 # ----- Manage directories
@@ -195,23 +323,51 @@ def rmrf(paths):
             rmfile(path)
 
 
+# Copies SRC to DST, like shutil.copy2(), recording the digest of its
+# content in DIGESTS (see copy())
+def _copydigest(src, dst, digests):
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    hfn = hashlib.sha256()
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            for data in iter(lambda: fsrc.read(_BUFSIZE), b''):
+                hfn.update(data)
+                fdst.write(data)
+    shutil.copystat(src, dst)
+    recorddigest(digests, dst, hfn.hexdigest())
+    return dst
+
+
+def recorddigest(digests, path, digest):
+    """Record the SHA-256 DIGEST of the file PATH, as it is now, in DIGESTS."""
+    st = os.stat(path)
+    digests[path] = (digest, st.st_size, st.st_mtime)
+
+
 # Copies SRC to DST
-# Uses shutil.copy2()
-def copy(src, dst, ignore=None):
+# Uses shutil.copy2().  With a DIGESTS dict the SHA-256 digest of each file
+# copied is recorded as it's copied: DIGESTS[dst] = (digest, size, mtime).
+def copy(src, dst, ignore=None, digests=None):
     verbose("  Copying {} to {}".format(src, dst))
+    if digests is None:
+        copy2 = shutil.copy2
+    else:
+        copy2 = partial(_copydigest, digests=digests)
+
     if os.path.isdir(src):
         if os.path.exists(dst):
             dst = os.path.join(dst, os.path.basename(src))
             if os.path.exists(dst):
-                copyinto(src, dst, ignore=ignore)
+                copyinto(src, dst, ignore=ignore, digests=digests)
                 return
-        shutil.copytree(src, dst, symlinks=True, ignore=ignore)
+        shutil.copytree(src, dst, symlinks=True, ignore=ignore, copy_function=copy2)
         return
 
     paths = glob.glob(src)
     if ignore is None:
         for path in paths:
-            shutil.copy2(path, dst)
+            copy2(path, dst)
         return
 
     dirs = {}
@@ -225,14 +381,14 @@ def copy(src, dst, ignore=None):
         ignored = ignore(path, files)
         for f in files:
             if f not in ignored:
-                shutil.copy2(os.path.join(path, f), dst)
+                copy2(os.path.join(path, f), dst)
 
 
 # Copies SRCDIR to DSTDIR
 # Copies the contents of SRCIR into DSTDIR
-def copyinto(srcdir, dstdir, ignore=None):
+def copyinto(srcdir, dstdir, ignore=None, digests=None):
     for fnm in os.listdir(srcdir):
-        copy(os.path.join(srcdir, fnm), dstdir, ignore=ignore)
+        copy(os.path.join(srcdir, fnm), dstdir, ignore=ignore, digests=digests)
 
 
 # Copy SRCLIST from SRCDIR to DSTDIR
@@ -269,42 +425,252 @@ def savefile(filename, txt):
         f.write(txt)
 
 
-def unpack_file(filenm, dest):
-    # Ugh.  On Windows we have to use --force-local with tar otherwise
-    # filenames with drive specifiers are considered remote files.  But we
-    # can't use this always because MacOS doesn't use GNU tar and their
-    # tar doesn't support --force-local.
-    tarargs = ['--force-local'] if Globals.iswindows else []
+def matchpath(name, patterns):
+    """Return True if the archive member NAME is selected by PATTERNS.
+
+    PATTERNS are glob patterns; a pattern that matches a directory selects
+    everything below it.
+    """
+    name = name.rstrip('/')
+    while name:
+        for pat in patterns:
+            if fnmatch.fnmatchcase(name, pat):
+                return True
+        name = name.rpartition('/')[0]
+    return False
+
+
+# Archive formats, identified by the magic bytes at the start of the file
+_MAGIC = [('gzip', b'\x1f\x8b'),
+          ('bzip2', b'BZh'),
+          ('xz', b'\xfd7zXZ\x00'),
+          ('lzip', b'LZIP'),
+          ('zstd', b'\x28\xb5\x2f\xfd'),
+          ('zip', b'PK\x03\x04'),
+          ('zip', b'PK\x05\x06')]
+
+# External decompressors that are faster than the stdlib codecs, in order
+# of preference.  If none is installed the stdlib codec is used; lzip has
+# no stdlib codec.
+_DECOMPRESSORS = {'gzip': [['pigz', '-d', '-c']],
+                  'bzip2': [['pbzip2', '-d', '-c'], ['lbzip2', '-d', '-c']],
+                  'xz': [['xz', '-T0', '-d', '-c']],
+                  'lzip': [['plzip', '-d', '-c'], ['lzip', '-d', '-c']],
+                  'zstd': [['zstd', '-q', '-d', '-c']]}
+
+_BUFSIZE = 1024 * 1024
+
+# The most output left after a reader is done that is read for the
+# decompressor to finish (a tar archive ends with padding): if there's more,
+# the reader stopped early and the decompressor is terminated.
+_DRAIN_LIMIT = 4 * 1024 * 1024
+
+# Keep the permissions from the archive, but nothing outside of dest
+_TARFILTER = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+
+
+def archiveformat(filenm):
+    """Return the archive format of FILENM from its content.
+
+    Returns 'zip', 'tar', or the compression of a compressed tar file.
+    """
+    with open(filenm, 'rb') as f:
+        head = f.read(512)
+    for fmt, magic in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if head[257:262] == b'ustar' or tarfile.is_tarfile(filenm):
+        return 'tar'
+    raise UnpackError("Unknown archive format: {}".format(filenm))
+
+
+def _stdlib_codec(fmt):
+    """Return a function to open a decompressing reader for FMT, or None."""
+    if fmt == 'gzip':
+        import gzip
+        return gzip.GzipFile
+    if fmt == 'bzip2':
+        import bz2
+        return bz2.BZ2File
+    if fmt == 'xz':
+        import lzma
+        return lzma.LZMAFile
+    if fmt == 'zstd':
+        try:
+            from compression import zstd
+        except ImportError:
+            return None
+        return zstd.ZstdFile
+    return None
 
-    mkdir(dest)
 
-    if filenm.endswith('.tar.xz'):
-        run("xz -d -c {} | tar xf - {}".format(filenm, ' '.join(tarargs)),
-            cwd=dest, shell=True)
-        return
+class _CountingReader(object):
+    """Count the bytes read from a file object."""
 
-    if filenm.endswith('.tar.bz2'):
-        cmd = ['tar', '-x']+tarargs+['-j', '-f', filenm]
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.count = 0
 
-    elif filenm.endswith('.tar.gz') or filenm.endswith('.tgz'):
-        cmd = ['tar', '-x']+tarargs+['-z', '-f', filenm]
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.count += len(data)
+        return data
 
-    elif filenm.endswith('.tar.lz') or filenm.endswith('.tlz'):
-        cmd = ['tar', '-x']+tarargs+['--lzip', '-f', filenm]
 
-    elif filenm.endswith('.tar'):
-        cmd = ['tar', '-x']+tarargs+['-f', filenm]
+@contextmanager
+def _decompress(filenm, fmt):
+    """Yield (reader, decompressor name) for the uncompressed FILENM."""
+    with open(filenm, 'rb') as raw:
+        if fmt == 'tar':
+            yield (raw, 'none')
+            return
 
-    elif filenm.endswith('.zip'):
-        cmd = ['unzip', filenm]
+        for cmd in _DECOMPRESSORS.get(fmt, []):
+            if which(cmd[0]) is not None:
+                break
+        else:
+            codec = _stdlib_codec(fmt)
+            if codec is None:
+                raise UnpackError("No {} decompressor found for {}".format(fmt, filenm))
+            with codec(fileobj=raw) if fmt == 'gzip' else codec(raw) as reader:
+                yield (reader, 'python')
+            return
+
+        proc = runcmd(cmd, stdin=raw, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Read stderr while stdout is read, so that the decompressor can't
+        # block on a full stderr pipe
+        errs = []
+        errthread = threading.Thread(target=lambda: errs.append(proc.stderr.read()))
+        errthread.daemon = True
+        errthread.start()
+        finished = False
+        try:
+            yield (proc.stdout, cmd[0])
+            # Read any trailing padding so the decompressor can finish
+            drained = 0
+            while drained <= _DRAIN_LIMIT:
+                data = proc.stdout.read(_BUFSIZE)
+                if not data:
+                    finished = True
+                    break
+                drained += len(data)
+        finally:
+            if not finished:
+                # Stopped early: don't decompress the rest
+                verbose("Stopping {} for {}".format(cmd[0], filenm))
+                try:
+                    proc.terminate()
+                except OSError:
+                    pass
+            proc.stdout.close()
+            ret = proc.wait()
+            errthread.join()
+            proc.stderr.close()
+        if finished and ret != 0:
+            raise UnpackError("Failed to decompress {} ({}):\n{}".format(
+                filenm, cmd[0], b''.join(errs).decode('utf-8', 'replace')))
+
+
+@contextmanager
+def opentar(filenm):
+    """Yield a streaming TarFile for the (possibly compressed) tar FILENM."""
+    with _decompress(filenm, archiveformat(filenm)) as (reader, _):
+        with tarfile.open(fileobj=reader, mode='r|') as tar:
+            yield tar
+
+
+def _extract_tar(filenm, fmt, dest, members):
+    # Stream through the archive once extracting only what we need.
+    # A hard link can refer to a file that we skipped: if so extract the
+    # content of that file again in a second pass.
+    # Permissions of directories are set at the end, in case they are not
+    # writable.  Returns (decompressor name, uncompressed size).
+    extracted = set()
+    links = {}
+    dirs = []
+    with _decompress(filenm, fmt) as (reader, name):
+        counter = _CountingReader(reader)
+        with tarfile.open(fileobj=counter, mode='r|') as tar:
+            for tinfo in tar:
+                if members is not None and not matchpath(tinfo.name, members):
+                    continue
+                if tinfo.islnk() and tinfo.linkname not in extracted:
+                    links.setdefault(tinfo.linkname, []).append(tinfo.name)
+                    continue
+                if tinfo.isdir():
+                    dirs.append(tinfo)
+                    tar.extract(tinfo, dest, set_attrs=False, **_TARFILTER)
+                else:
+                    tar.extract(tinfo, dest, **_TARFILTER)
+                extracted.add(tinfo.name)
+
+    if links:
+        with _decompress(filenm, fmt) as (reader, _):
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                for tinfo in tar:
+                    names = links.get(tinfo.name)
+                    if not names:
+                        continue
+                    tinfo.name = names[0]
+                    tar.extract(tinfo, dest, **_TARFILTER)
+                    first = os.path.join(dest, *names[0].split('/'))
+                    for lnk in names[1:]:
+                        shutil.copy2(first, os.path.join(dest, *lnk.split('/')))
+
+    for tinfo in reversed(dirs):
+        os.chmod(os.path.join(dest, *tinfo.name.rstrip('/').split('/')),
+                 stat.S_IMODE(tinfo.mode) & 0o755)
+    return (name, counter.count)
+
+
+def _extract_zip(filenm, dest, members):
+    # Returns (decompressor name, uncompressed size)
+    size = 0
+    with zipfile.ZipFile(filenm) as zf:
+        for zinfo in zf.infolist():
+            if members is not None and not matchpath(zinfo.filename, members):
+                continue
+            size += zinfo.file_size
+            mode = zinfo.external_attr >> 16
+            path = os.path.join(dest, *zinfo.filename.rstrip('/').split('/'))
+            if zinfo.create_system == 3 and stat.S_ISLNK(mode) and not Globals.iswindows:
+                mkdir(os.path.dirname(path))
+                os.symlink(zf.read(zinfo).decode('utf-8'), path)
+                continue
+            zf.extract(zinfo, dest)
+            if zinfo.create_system == 3 and stat.S_IMODE(mode) and not zinfo.is_dir():
+                os.chmod(path, stat.S_IMODE(mode))
+    return ('python', size)
+
+
+def unpack_file(filenm, dest, members=None):
+    """Unpack the archive FILENM into the directory DEST.
+
+    The format is detected from the content, not the file name: tar files,
+    possibly compressed with gzip, bzip2, xz, lzip or zstd, and zip files
+    are supported.  If MEMBERS is given it's a list of patterns (see
+    matchpath()) and only those members of the archive are extracted.
+    """
+    mkdir(dest)
+    fmt = archiveformat(filenm)
+    verbose("Unpacking {}{} ({}) ...".format(
+        '' if members is None else '{} members of '.format(len(members)),
+        filenm, fmt))
 
-    else:
-        raise UnpackError("Unknown local file type: "+filenm)
+    start = time.time()
+    try:
+        if fmt == 'zip':
+            (name, size) = _extract_zip(filenm, dest, members)
+        else:
+            (name, size) = _extract_tar(filenm, fmt, dest, members)
+    except (tarfile.TarError, zipfile.BadZipfile, EOFError, EnvironmentError) as ex:
+        raise UnpackError("Failed to extract {}: {}".format(filenm, str(ex)))
 
-    verbose("Unpacking {} using {} ...".format(filenm, cmd[0]))
-    (ret, out, err) = runout(cmd, cwd=dest)
-    if ret != 0:
-        raise UnpackError("Failed to extract {}:\n{}{}".format(filenm, out, err))
+    elapsed = max(time.time() - start, 0.001)
+    mbytes = float(1024 * 1024)
+    verbose("Unpacked {}: {} using {}, {:.1f}MB -> {:.1f}MB in {:.2f}s ({:.1f}MB/s)".format(
+        os.path.basename(filenm), fmt, name, os.path.getsize(filenm) / mbytes,
+        size / mbytes, elapsed, size / mbytes / elapsed))
 
 
 # ----- Run commands
@@ -369,8 +735,199 @@ def _getcmd(args, kwargs):
                               shl)
 
 
+# ----- Subprocess events
+#
+# Every process started by runcmd() is recorded once it has been waited
+# for, as a line of JSON in Globals.commandlog:
+#
+#   {"argv": [...], "cwd": <dir>, "start": <epoch seconds>,
+#    "duration": <seconds>, "exit": <code>,
+#    "maxrss_kb": <peak RSS>, "user": <CPU seconds>, "sys": <CPU seconds>,
+#    "read_bytes": <bytes>, "written_bytes": <bytes>,
+#    "stdout_bytes": <bytes>, "stderr_bytes": <bytes>, "context": <label>}
+#
+# The resource usage (including the bytes read from and written to storage,
+# from the block counts) comes from wait4(), so it's null where there's no
+# wait4().  Output sizes are only known for output that was captured with
+# communicate().  The context is the label set by commandcontext() in the
+# thread that started the process, e.g. the build step it belongs to.
+
+_clock = getattr(time, 'monotonic', time.time)
+
+_EVENTS = []
+_EVENTS_LOCK = threading.Lock()
+_EVENTS_FILE = None
+
+_CONTEXT = threading.local()
+
+
+@contextmanager
+def commandcontext(label):
+    """Record LABEL with the processes this thread starts while in the context."""
+    old = getattr(_CONTEXT, 'label', None)
+    _CONTEXT.label = label
+    try:
+        yield
+    finally:
+        _CONTEXT.label = old
+
+
+def currentcontext():
+    """Return the label set by commandcontext() in this thread, or None."""
+    return getattr(_CONTEXT, 'label', None)
+
+
+def _logevent(event):
+    global _EVENTS_FILE
+    with _EVENTS_LOCK:
+        _EVENTS.append(event)
+        if Globals.commandlog is None:
+            return
+        if _EVENTS_FILE is None:
+            mkdir(os.path.dirname(Globals.commandlog))
+            _EVENTS_FILE = open(Globals.commandlog, 'w')
+        _EVENTS_FILE.write(json.dumps(event, sort_keys=True) + '\n')
+        _EVENTS_FILE.flush()
+
+
+class _Process(subprocess.Popen):
+    """A Popen that records an event when the process has finished."""
+
+    def __init__(self, args, argv, **kwargs):
+        self._argv = argv
+        self._cwd = os.path.abspath(kwargs.get('cwd') or os.curdir)
+        self._start = time.time()
+        self._started = _clock()
+        self._ended = None
+        self._rusage = None
+        self._recorded = False
+        self._communicating = False
+        self._context = currentcontext()
+        super(_Process, self).__init__(args, **kwargs)
+
+    def _reap(self, flags):
+        """Reap the process with wait4(), to get its resource usage.
+
+        Returns False if wait4() can't be used, e.g. if it was reaped
+        elsewhere.  The returncode is only set if it has finished.
+        """
+        if not hasattr(os, 'wait4'):
+            return False
+        try:
+            (pid, sts, rusage) = os.wait4(self.pid, flags)
+        except OSError as ex:
+            if ex.errno != errno.ECHILD:
+                raise
+            return False
+        if pid == self.pid:
+            self._ended = _clock()
+            self._rusage = rusage
+            self.returncode = -os.WTERMSIG(sts) if os.WIFSIGNALED(sts) else os.WEXITSTATUS(sts)
+        return True
+
+    def poll(self):
+        if self.returncode is None and not self._reap(os.WNOHANG if hasattr(os, 'WNOHANG') else 0):
+            super(_Process, self).poll()
+        if self.returncode is not None and self._ended is None:
+            self._ended = _clock()
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            if timeout is None:
+                reaped = self._reap(0)
+            else:
+                # Poll, so that the process is reaped by wait4() too
+                deadline = _clock() + timeout
+                while self.poll() is None:
+                    remaining = deadline - _clock()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(self.args, timeout)
+                    time.sleep(min(remaining, 0.05))
+                reaped = True
+            if not reaped:
+                super(_Process, self).wait()
+            if self._ended is None:
+                self._ended = _clock()
+        if not self._communicating:
+            self._record()
+        return self.returncode
+
+    def communicate(self, *args, **kwargs):
+        self._communicating = True
+        try:
+            (out, err) = super(_Process, self).communicate(*args, **kwargs)
+        finally:
+            self._communicating = False
+        self._record(out, err)
+        return (out, err)
+
+    def _record(self, out=None, err=None):
+        if self._recorded or self.returncode is None:
+            return
+        self._recorded = True
+        event = {'argv': self._argv,
+                 'cwd': self._cwd,
+                 'start': round(self._start, 3),
+                 'duration': round((self._ended or _clock()) - self._started, 3),
+                 'exit': self.returncode,
+                 'maxrss_kb': None,
+                 'user': None,
+                 'sys': None,
+                 'read_bytes': None,
+                 'written_bytes': None,
+                 'stdout_bytes': None if out is None else len(out),
+                 'stderr_bytes': None if err is None else len(err),
+                 'context': self._context}
+        if self._rusage is not None:
+            maxrss = self._rusage.ru_maxrss
+            if sys.platform == 'darwin':
+                # Reported in bytes rather than KiB
+                maxrss //= 1024
+            event.update(maxrss_kb=maxrss,
+                         user=round(self._rusage.ru_utime, 3),
+                         sys=round(self._rusage.ru_stime, 3),
+                         read_bytes=self._rusage.ru_inblock * 512,
+                         written_bytes=self._rusage.ru_oublock * 512)
+        _logevent(event)
+
+
+def commandevents():
+    """Return the events recorded so far, oldest first."""
+    with _EVENTS_LOCK:
+        return list(_EVENTS)
+
+
+def commandsummary(count=5):
+    """Return lines describing the COUNT commands that took the longest."""
+    events = commandevents()
+    if not events:
+        return []
+
+    lines = ['{} commands ran for {:.1f}s in total{}'.format(
+        len(events), sum(e['duration'] for e in events),
+        ' (see {})'.format(Globals.commandlog) if Globals.commandlog else '')]
+
+    programs = {}
+    for event in events:
+        prog = os.path.basename(event['argv'][0]) if event['argv'] else '?'
+        (duration, runs) = programs.get(prog, (0.0, 0))
+        programs[prog] = (duration + event['duration'], runs + 1)
+    top = sorted(programs.items(), key=lambda p: (-p[1][0], p[0]))[:count]
+    lines.append('  By program: ' + ', '.join(
+        '{} {:.1f}s ({})'.format(prog, duration, runs) for prog, (duration, runs) in top))
+
+    for event in sorted(events, key=lambda e: -e['duration'])[:count]:
+        cmd = ' '.join(_quotearg(a) for a in event['argv'])
+        if len(cmd) > 100:
+            cmd = cmd[:97] + '...'
+        lines.append('  {:8.1f}s  {}'.format(event['duration'], cmd))
+    return lines
+
+
 def runcmd(args, **kwargs):
     argstr = _getcmd(args, kwargs)
+    argv = [str(a) for a in args]
 
     # If we want to run a shell, just use a single string
     if kwargs.get('shell'):
@@ -397,7 +954,7 @@ def runcmd(args, **kwargs):
 
     # Run the program
     sys.stdout.flush()
-    return subprocess.Popen(args, **kwargs)
+    return _Process(args, argv, **kwargs)
 
 
 def run(args, **kwargs):
@@ -425,8 +982,69 @@ def runout(args, **kwargs):
         return (1, '', str(ex))
 
 
-def pipinstall(pkgname, pkgroot):
-    # Use pip to install a package and its prerequisites.
+def _wheelhouse(py, requirements):
+    """Return the wheelhouse directory for REQUIREMENTS, filling it if needed.
+
+    Wheelhouses are kept under the download root, keyed by the requirements
+    and the version and platform of the python interpreter PY, so that
+    installing the same requirements again doesn't need the network.  Only
+    the requirements themselves are pinned, so a wheelhouse is filled again
+    once it's older than Globals.wheelhouse_max_age days, and wheelhouses
+    that old are removed.
+    """
+    (ret, out, err) = runout([py, '-c', 'import sys, sysconfig; '
+                              'print("%d.%d %s" % (sys.version_info[0], sys.version_info[1], '
+                              'sysconfig.get_platform()))'])
+    if ret != 0:
+        raise CommandError("Cannot get the platform of %s:\n%s" % (py, (out + err).rstrip()))
+    key = [sorted(requirements), out.strip()]
+
+    hfn = hashlib.sha256(json.dumps(key).encode('utf-8'))
+    whroot = os.path.join(Globals.downloadroot, 'wheelhouse')
+    whdir = os.path.join(whroot, hfn.hexdigest()[:16])
+    created = _wheelhousecreated(whdir)
+    maxage = float(Globals.wheelhouse_max_age) * 24 * 60 * 60
+    if created is not None and time.time() - created < maxage:
+        verbose("Using wheelhouse {} for {}".format(whdir, ', '.join(requirements)))
+    else:
+        if created is not None:
+            info("Refreshing wheelhouse for {}".format(', '.join(requirements)))
+        # Fill a temporary directory so that an interrupted pip leaves nothing
+        tmp = whdir + '.tmp'
+        rmdir(tmp)
+        run([py, '-m', 'pip', 'wheel', '--disable-pip-version-check',
+             '--isolated', '--no-cache-dir', '--no-input', '-w', tmp] + requirements)
+        savefile(os.path.join(tmp, 'requirements.json'),
+                 json.dumps({'key': key, 'created': time.time()}))
+        rmdir(whdir)
+        os.rename(tmp, whdir)
+
+    # Remove the wheelhouses that would be filled again if they were used
+    for name in os.listdir(whroot):
+        path = os.path.join(whroot, name)
+        if path == whdir or name.endswith('.tmp') or not os.path.isdir(path):
+            continue
+        created = _wheelhousecreated(path)
+        if created is None or time.time() - created >= maxage:
+            verbose("Removing expired wheelhouse {}".format(path))
+            rmdir(path)
+    return whdir
+
+
+def _wheelhousecreated(whdir):
+    """Return when the wheelhouse WHDIR was filled, or None if it's not valid."""
+    try:
+        created = json.loads(loadfile(os.path.join(whdir, 'requirements.json')))['created']
+    except (EnvironmentError, ValueError, KeyError, TypeError):
+        return None
+    return float(created)
+
+
+def pipinstall(pkgnames, pkgroot):
+    # Use pip to install packages and their prerequisites.  PKGNAMES is
+    # a requirement or a list of requirements to resolve together.
+    if isinstance(pkgnames, str):
+        pkgnames = [pkgnames]
     if Globals.pythonversion == 2:
         exes = ['nuopython', 'python2', 'python']
     else:
@@ -444,6 +1062,11 @@ def pipinstall(pkgname, pkgroot):
     if ' %d.' % (Globals.pythonversion) not in out+err:
         raise CommandError("Incorrect python intepreter version; want %d got %s:\n%s"
                            % (Globals.pythonversion, py, (out + err).rstrip()))
-    run([py, '-m', 'pip', 'install', '--disable-pip-version-check',
-         '--isolated', '--no-cache-dir', '--no-input', '-t', pkgroot,
-         pkgname + '; python_version < "%d"' % (Globals.pythonversion+1)])
+
+    requirements = [name + '; python_version < "%d"' % (Globals.pythonversion+1)
+                    for name in pkgnames]
+    args = [py, '-m', 'pip', 'install', '--disable-pip-version-check',
+            '--isolated', '--no-cache-dir', '--no-input', '-t', pkgroot]
+    if Globals.wheelhouse:
+        args += ['--no-index', '--find-links', _wheelhouse(py, requirements)]
+    run(args + requirements)
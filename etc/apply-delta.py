@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+#
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Apply a NuoDB client delta package to an existing installation.
+#
+# usage: apply-delta.py [--dry-run] [--force] <delta> <install-dir>
+#
+# <delta> is a delta archive (.delta.tar.gz / .delta.zip) or its extracted
+# directory.  The installation is checked before anything is changed: every
+# file the delta replaces or removes must have the expected content, unless
+# --force is given.  After applying, the installation is checked against
+# the manifest of the new version.
+
+import os
+import sys
+import argparse
+import hashlib
+import json
+import shutil
+import stat
+import tarfile
+import tempfile
+import zipfile
+
+DELTA_FORMAT = 1
+
+_BUFSIZE = 1024 * 1024
+
+
+class DeltaError(Exception):
+    pass
+
+
+def digest(path):
+    hfn = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(_BUFSIZE), b''):
+            hfn.update(data)
+    return hfn.hexdigest()
+
+
+def localpath(root, path):
+    return os.path.join(root, *path.split('/'))
+
+
+def matches(root, path, entry):
+    """Return True if PATH under ROOT matches the manifest ENTRY."""
+    fnm = localpath(root, path)
+    if 'link' in entry:
+        return os.path.islink(fnm) and os.readlink(fnm) == entry['link']
+    if os.path.islink(fnm) or not os.path.isfile(fnm):
+        return False
+    return (os.path.getsize(fnm) == entry['size']
+            and digest(fnm) == entry['sha256'])
+
+
+def extract(delta, tmpdir):
+    """Return the directory containing the extracted DELTA."""
+    if os.path.isdir(delta):
+        return delta
+    if delta.endswith('.zip'):
+        with zipfile.ZipFile(delta) as zf:
+            zf.extractall(tmpdir)
+    else:
+        with tarfile.open(delta, 'r:*') as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(tmpdir, filter='data')
+            else:
+                tar.extractall(tmpdir)
+    subdirs = os.listdir(tmpdir)
+    if len(subdirs) != 1:
+        raise DeltaError("Invalid delta package: {}".format(delta))
+    return os.path.join(tmpdir, subdirs[0])
+
+
+def applied(root, delta):
+    """Return True if DELTA has already been applied to ROOT."""
+    for path in delta['removed']:
+        if os.path.lexists(localpath(root, path)):
+            return False
+    for path in delta['added'] + delta['changed']:
+        if not matches(root, path, delta['manifest'][path]):
+            return False
+    return True
+
+
+def check(root, delta, force):
+    """Check that ROOT is in the state DELTA expects."""
+    problems = []
+    for path, entry in sorted(delta['before'].items()):
+        if not matches(root, path, entry):
+            problems.append("Unexpected content: {}".format(path))
+    for path in delta['added']:
+        fnm = localpath(root, path)
+        if os.path.lexists(fnm) and not matches(root, path, delta['manifest'][path]):
+            problems.append("Unexpected file: {}".format(path))
+    if problems and not force:
+        raise DeltaError("Installation does not match {}:\n  {}".format(
+            delta['from'], '\n  '.join(problems)))
+    return problems
+
+
+def install(root, srcdir, path, entry):
+    """Install PATH described by ENTRY under ROOT."""
+    fnm = localpath(root, path)
+    dirname = os.path.dirname(fnm)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    if os.path.lexists(fnm) and (os.path.islink(fnm) or os.path.isfile(fnm)):
+        os.remove(fnm)
+    if 'link' in entry:
+        os.symlink(entry['link'], fnm)
+        return
+    # Copy next to the destination first so a failure doesn't leave a
+    # partially-written file behind.
+    tmp = fnm + '.delta-tmp'
+    shutil.copyfile(localpath(os.path.join(srcdir, 'files'), path), tmp)
+    os.chmod(tmp, entry['mode'])
+    os.rename(tmp, fnm)
+
+
+def remove(root, path, keep):
+    """Remove PATH under ROOT and any parent directories it leaves empty."""
+    fnm = localpath(root, path)
+    if os.path.lexists(fnm):
+        if not os.path.islink(fnm):
+            os.chmod(fnm, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(fnm)
+    parent = os.path.dirname(path)
+    while parent and parent not in keep:
+        dirname = localpath(root, parent)
+        if not os.path.isdir(dirname) or os.listdir(dirname):
+            break
+        os.rmdir(dirname)
+        parent = os.path.dirname(parent)
+
+
+def verify(root, delta, written):
+    """Verify ROOT against the new manifest; fully check WRITTEN files."""
+    problems = []
+    for path, entry in sorted(delta['manifest'].items()):
+        fnm = localpath(root, path)
+        if path in written:
+            ok = matches(root, path, entry)
+        elif 'link' in entry:
+            ok = os.path.islink(fnm)
+        else:
+            ok = os.path.isfile(fnm) and os.path.getsize(fnm) == entry['size']
+        if not ok:
+            problems.append(path)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Apply a NuoDB client delta package to an installation')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Check the installation but do not change it')
+    parser.add_argument('--force', action='store_true',
+                        help='Apply even if the installation has unexpected content')
+    parser.add_argument('delta', help='Delta package archive or directory')
+    parser.add_argument('root', help='NuoDB client installation directory')
+    options = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='nuodb-delta-')
+    try:
+        srcdir = extract(options.delta, tmpdir)
+        with open(os.path.join(srcdir, 'DELTA.json')) as f:
+            delta = json.load(f)
+        if delta.get('format') != DELTA_FORMAT:
+            raise DeltaError("Unsupported delta format: {}".format(delta.get('format')))
+
+        if applied(options.root, delta):
+            print("{} is already updated to {}".format(options.root, delta['to']))
+            return 0
+
+        problems = check(options.root, delta, options.force)
+        for problem in problems:
+            print("Warning: {}".format(problem))
+
+        print("Delta {} -> {}: {} added, {} changed, {} removed".format(
+            delta['from'], delta['to'], len(delta['added']),
+            len(delta['changed']), len(delta['removed'])))
+        if options.dry_run:
+            return 0
+
+        keep = set()
+        for path in delta['manifest']:
+            parent = os.path.dirname(path)
+            while parent and parent not in keep:
+                keep.add(parent)
+                parent = os.path.dirname(parent)
+        for path in delta['removed']:
+            remove(options.root, path, keep)
+
+        written = delta['added'] + delta['changed']
+        for path in written:
+            install(options.root, srcdir, path, delta['manifest'][path])
+
+        problems = verify(options.root, delta, set(written))
+        if problems:
+            raise DeltaError("Installation does not match {} after update:\n  {}".format(
+                delta['to'], '\n  '.join(problems)))
+        print("Updated {} to {}".format(options.root, delta['to']))
+        return 0
+
+    except (DeltaError, EnvironmentError, ValueError, KeyError) as ex:
+        sys.stderr.write("Failed: {}\n".format(str(ex)))
+        return 1
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
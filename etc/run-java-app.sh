@@ -66,6 +66,16 @@ setup () {
 # Sets $JAVA to the path, or dies if none available.
 
 find_java () {
+    # Probing runs java -version for each candidate, which is slow: reuse
+    # the result of the last probe unless NUODB_JAVA_REPROBE is set.
+    JAVA_CACHE=${NUODB_RUNDIR:+$NUODB_RUNDIR/java-probe}
+    [ -z "$NUODB_JAVA_REPROBE" ] && load_java_cache && return
+
+    probe_java
+    save_java_cache
+}
+
+probe_java () {
     # If JAVA_HOME is set, use that.
     if [ -n "$JAVA_HOME" ]; then
         JAVA="$JAVA_HOME/bin/java"
@@ -104,14 +114,60 @@ findall () {
 find_java_base () {
     # Use a standard path search algorithm, and look in some common places
     # that JREs are stashed.
-    JAVA=$( (findall java;
-             ls -1 /usr/lib/jvm/*/bin/java /usr/java/*/bin/java) 2>/dev/null \
-              | while read java; do
-                    # Check for compatible java version
-                    check_java_version "$java" || continue
-                    echo "$java"
-                    break
-                 done)
+    _found=$( (findall java;
+               ls -1 /usr/lib/jvm/*/bin/java /usr/java/*/bin/java) 2>/dev/null \
+                | while read java; do
+                      # Check for compatible java version
+                      check_java_version "$java" || continue
+                      echo "$JAVAVERSION $java"
+                      break
+                   done)
+    JAVAVERSION=${_found%% *}
+    JAVA=${_found#* }
+}
+
+# The probe result is cached in $JAVA_CACHE.  It's valid while the Java
+# binary is unchanged, and the settings the probe depends on are the same.
+
+file_mtime () {
+    # GNU, then BSD stat
+    stat -L -c %Y "$1" 2>/dev/null || stat -L -f %m "$1" 2>/dev/null
+}
+
+load_java_cache () {
+    [ -n "$JAVA_CACHE" ] && [ -f "$JAVA_CACHE" ] || return 1
+    {
+        read -r _c_java
+        read -r _c_mtime
+        read -r _c_version
+        read -r _c_minver
+        read -r _c_home
+        read -r _c_path
+    } < "$JAVA_CACHE" || return 1
+
+    [ -n "$_c_java" ] && [ -x "$_c_java" ] \
+        && [ "$_c_minver" = "$JAVA_MINVER" ] \
+        && [ "$_c_home" = "$JAVA_HOME" ] \
+        && [ "$_c_path" = "$PATH" ] \
+        && [ "$_c_mtime" = "$(file_mtime "$_c_java")" ] \
+        || return 1
+
+    JAVA="$_c_java"
+    JAVAVERSION="$_c_version"
+    return 0
+}
+
+save_java_cache () {
+    [ -n "$JAVA_CACHE" ] && [ -d "${JAVA_CACHE%/*}" ] || return 0
+    _c_mtime=$(file_mtime "$JAVA")
+    [ -n "$_c_mtime" ] || return 0
+
+    # Replace the cache atomically, in case another launcher is reading it
+    printf '%s\n' "$JAVA" "$_c_mtime" "$JAVAVERSION" "$JAVA_MINVER" \
+           "$JAVA_HOME" "$PATH" > "$JAVA_CACHE.$$" 2>/dev/null \
+        && mv -f "$JAVA_CACHE.$$" "$JAVA_CACHE" 2>/dev/null \
+        || rm -f "$JAVA_CACHE.$$"
+    return 0
 }
 
 check_java_version () {
@@ -125,6 +181,20 @@ check_java_version () {
 # --------------------------------------------------
 # This starts a Java application directly.
 
+# Use the class data sharing archive for the jar if it was created by this
+# version of Java (see ./build --appcds).  The build checked that the JVM
+# accepts it once installed: if it doesn't, let the JVM's warning show.
+use_appcds () {
+    APPCDS_OPT=
+    _jsa="${jar%.jar}.jsa"
+    [ -f "$_jsa" ] && [ -f "$_jsa.version" ] || return 0
+    read -r _jsaversion < "$_jsa.version"
+    [ -n "$JAVAVERSION" ] && [ "$_jsaversion" = "$JAVAVERSION" ] || return 0
+    APPCDS_OPT="-XX:SharedArchiveFile=$_jsa"
+}
+
 setup
 find_java
-exec "$JAVA" $NUODB_JAVA_OPTS -jar "$jar" "$@" || exit 1
+use_appcds
+exec "$JAVA" ${APPCDS_OPT:+"$APPCDS_OPT"} \
+    $NUODB_JAVA_OPTS -jar "$jar" "$@" || exit 1
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+#
+# (C) Copyright NuoDB, Inc. 2026  All Rights Reserved.
+#
+# Check that a NuoDB client installation is intact.
+#
+# usage: verify-install.py [--deep] [--jobs N] [--manifest PATH]... [<install-dir>]
+#
+# The installation (by default the one this script is in) is checked against
+# the manifest of each bundle in it (etc/manifest/<bundle>.json), or against
+# the given manifests, e.g. a package's .manifest.json in the build tree.
+#
+# By default every file is checked with stat(): only files that have the
+# right size but not the timestamp that the package gave them (allowing for
+# how zip files store times) are read to check their digest.  With --deep
+# every file is read.  Files are read concurrently.  Exits with 1 if there
+# are any problems.
+
+import os
+import sys
+import argparse
+import glob
+import hashlib
+import json
+import stat
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_DIR = 'etc/manifest'
+
+_BUFSIZE = 1024 * 1024
+
+
+class VerifyError(Exception):
+    pass
+
+
+def digest(path):
+    hfn = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(_BUFSIZE), b''):
+            hfn.update(data)
+    return hfn.hexdigest()
+
+
+def localpath(root, path):
+    return os.path.join(root, *path.split('/'))
+
+
+def loadmanifests(root, paths):
+    """Return the files to check as {path: entry}, and the manifest names."""
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(localpath(root, MANIFEST_DIR), '*.json')))
+        if not paths:
+            raise VerifyError("No manifests in {}".format(localpath(root, MANIFEST_DIR)))
+
+    files = {}
+    names = []
+    for path in paths:
+        with open(path) as f:
+            manifest = json.load(f)
+        names.append(manifest.get('bundle') or os.path.basename(path))
+        mtime = manifest.get('mtime')
+        for rel, entry in manifest['files'].items():
+            # The installed manifests can't describe themselves
+            if rel.startswith(MANIFEST_DIR + '/'):
+                continue
+            files[rel] = dict(entry, mtime=mtime)
+    return (files, names)
+
+
+def statcheck(root, path, entry, deep):
+    """Check PATH under ROOT against ENTRY without reading it.
+
+    Returns (problem, needs digest).
+    """
+    fnm = localpath(root, path)
+    try:
+        st = os.lstat(fnm)
+    except OSError:
+        return ('missing', False)
+    if 'link' in entry:
+        if not stat.S_ISLNK(st.st_mode):
+            return ('not a symbolic link', False)
+        if os.readlink(fnm) != entry['link']:
+            return ('wrong link target', False)
+        return (None, False)
+    if not stat.S_ISREG(st.st_mode):
+        return ('not a file', False)
+    if st.st_size != entry['size']:
+        return ('changed', False)
+    if os.name == 'posix' and bool(st.st_mode & 0o111) != bool(entry['mode'] & 0o111):
+        return ('wrong permissions', False)
+    return (None, deep or entry['mtime'] is None or not mtimematches(st.st_mtime, entry['mtime']))
+
+
+def mtimematches(mtime, expected):
+    """Return True if MTIME is the time EXPECTED that the package gave files.
+
+    Zip files store DOS times, which have 2-second resolution and are read
+    as local time, so extractors that ignore the exact time also stored
+    give files a time that's off by the time zone's offset from UTC.
+    """
+    delta = int(mtime) - expected
+    if abs(delta) <= 2:
+        return True
+    offset = time.localtime(expected).tm_gmtoff
+    return abs(delta + offset) <= 2
+
+
+def verify(root, files, deep=False, jobs=None):
+    """Return the sorted (path, problem) for the FILES that don't match."""
+    problems = []
+    toread = []
+    for path, entry in files.items():
+        (problem, needdigest) = statcheck(root, path, entry, deep)
+        if problem is not None:
+            problems.append((path, problem))
+        elif needdigest:
+            toread.append(path)
+
+    def check(path):
+        try:
+            if digest(localpath(root, path)) != files[path]['sha256']:
+                return (path, 'changed')
+        except EnvironmentError as ex:
+            return (path, str(ex))
+        return None
+
+    if toread:
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            problems += [p for p in pool.map(check, toread) if p is not None]
+    return (sorted(problems), len(toread))
+
+
+def main():
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(
+        description='Check that a NuoDB client installation is intact')
+    parser.add_argument('--deep', action='store_true',
+                        help='Check the digest of every file')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Number of files to read at once (default: number of CPUs)')
+    parser.add_argument('--manifest', metavar='PATH', action='append',
+                        help='Check against this manifest rather than the '
+                             'installed ones.  May be repeated.')
+    parser.add_argument('root', nargs='?', default=here,
+                        help='NuoDB client installation directory '
+                             '(default: the one containing this script)')
+    options = parser.parse_args()
+
+    start = time.time()
+    try:
+        (files, names) = loadmanifests(options.root, options.manifest)
+        (problems, read) = verify(options.root, files, options.deep, options.jobs)
+    except (VerifyError, EnvironmentError, ValueError, KeyError) as ex:
+        sys.stderr.write("Failed: {}\n".format(str(ex)))
+        return 1
+
+    for path, problem in problems:
+        print("{}: {}".format(path, problem))
+    print("Checked {} files ({} read) of {} in {:.0f} ms: {}".format(
+        len(files), read, ', '.join(names), (time.time() - start) * 1000,
+        '{} problems'.format(len(problems)) if problems else 'OK'))
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())